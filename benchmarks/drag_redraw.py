@@ -0,0 +1,83 @@
+
+'''
+Time one frame of dragging a node in servo_out's Plot, blitted
+against a full redraw. Runs without a display on the Agg canvas
+
+    python benchmarks/drag_redraw.py [seconds] [frames]
+'''
+
+import logging
+import os
+import sys
+from time import perf_counter
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routine_model
+import sketch_budget
+from servo_out import Plot
+
+
+BUDGET_MS = 5      # Longest a blitted drag frame may take
+
+# The axis label font is usually missing on headless machines
+logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+
+
+class Stand():
+    '''Stands in for the PlotPage and SettingsPage around a Plot'''
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def makePlot(seconds):
+    '''Plot with just enough of a PlotPage and SettingsPage around it'''
+
+    settings = Stand(node_default_val=90, budget=sketch_budget.SketchBudget())
+    page = Stand(name='bench', parent=settings, isShown=lambda: True)
+
+    routine = routine_model.Routine('bench', [90]*(seconds*2 + 1))
+    plot = Plot(page, routine, 1)
+    plot.buildFigure()
+    FigureCanvasAgg(plot.fig)
+    plot.fig.canvas.draw()
+
+    return plot
+
+
+def timeFrames(plot, redraw, frames):
+    '''Milliseconds per frame, moving a node in view up and down'''
+
+    index = 10
+    start = perf_counter()
+    for frame in range(frames):
+        plot.routine.set(index, 20 + (frame*7) % 140)
+        redraw()
+
+    return (perf_counter() - start) * 1000 / frames
+
+
+def main(seconds=360, frames=200):
+    plot = makePlot(seconds)
+
+    full_ms = timeFrames(plot, plot.update, frames)
+
+    plot.startBlit()
+    blit_ms = timeFrames(plot, plot.blit, frames)
+    plot.stopBlit()
+
+    print('{} s routine, {} frames'.format(seconds, frames))
+    print('Full redraw: {:.2f} ms per frame'.format(full_ms))
+    print('Blitted:     {:.2f} ms per frame (budget {} ms)'.format(
+        blit_ms, BUDGET_MS))
+
+    return blit_ms <= BUDGET_MS
+
+
+if __name__ == '__main__':
+
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,399 @@
+'''
+Time the hot paths of exporting, interpolating, saving and loading,
+redrawing and recording, over synthetic shows of several sizes.
+Results are written as JSON, so two commits can be compared
+
+    python benchmarks/hot_paths.py [-o results.json] [--compare old.json]
+                                   [--quick] [-k name]
+'''
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from time import perf_counter
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import routine_model
+import sample_resampler
+import serial_reader
+import servo_file
+import sketch_output
+
+
+# Shows of every number of servos with every length
+SERVOS = (1, 4, 8)
+SECONDS = (10, 600, 3600)
+QUICK_SERVOS = (1, 4)
+QUICK_SECONDS = (10, 600)
+
+MILLIS = 15         # Interpolation interval of the sketch
+SAMPLE_MS = 20      # As servo_in records: a frame every 20 ms,
+DRAIN_MS = 50       # drained by the GUI every 50 ms
+READ_BYTES = 64     # Bytes the serial thread gets per read, roughly
+
+MIN_RUN_S = 0.05    # Calls are repeated until a run takes at least this long
+THRESHOLD = 1.2     # Slower than the compared results by this much is a regression
+
+
+# name -> (setup, runs once per servo count)
+BENCHMARKS = {}
+
+# Folder for the files benchmarks write, removed after the run
+_work_dir = None
+
+
+def benchmark(name, per_servos=True):
+    '''
+    Register setup(servos, seconds), which returns the function to
+    time. Benchmarks that do not depend on the number of servos only
+    run with one
+    '''
+
+    def register(setup):
+        BENCHMARKS[name] = (setup, per_servos)
+        return setup
+
+    return register
+
+
+def workFile(name):
+    '''Path of name in the run's folder'''
+
+    return os.path.join(_work_dir, name)
+
+
+def makeShow(servos, seconds, seed=0):
+    '''Show of random walks between the limits, the same every time'''
+
+    rng = np.random.RandomState(seed)
+    routines = []
+    for servo in range(servos):
+        steps = rng.randint(-15, 16, size=seconds*2 + 1)
+        values = np.clip(90 + np.cumsum(steps), 0, 179).astype(np.uint8)
+        routines.append(routine_model.Routine('servo_{}'.format(servo),
+            values, pin=servo + 2))
+
+    return routine_model.Show(routines, 'None', 'pins', 'full', MILLIS)
+
+
+def makeFrames(servos, seconds, seed=0):
+    '''Bytes the recording sketch would send for a show of seconds'''
+
+    values = np.stack([routine.ys for routine
+                       in makeShow(servos, seconds, seed).routines], axis=1)
+
+    # Frames between keyframes hold the keyframe before
+    count = seconds * 1000 // SAMPLE_MS
+    keys = np.arange(count) * SAMPLE_MS // 500
+
+    frames = []
+    for sequence, key in enumerate(keys):
+        frame = serial_reader.HEADER.pack(serial_reader.SYNC_BYTE,
+            serial_reader.VERSION, sequence & 0xFFFF, sequence*SAMPLE_MS,
+            servos) + values[key].tobytes()
+        # The CRC does not cover the sync byte
+        frames.append(frame + bytes([serial_reader.crc8(frame[1:])]))
+
+    return b''.join(frames)
+
+
+@benchmark('inbetweeners')
+def benchInBetweeners(servos, seconds):
+    routines = [routine.ys for routine in makeShow(servos, seconds).routines]
+    return lambda: sketch_output.inBetweeners(routines, MILLIS)
+
+
+@benchmark('pretty_output', per_servos=False)
+def benchPrettyOutput(servos, seconds):
+    routine = makeShow(1, seconds).routines[0].ys
+    arr = sketch_output.inBetweeners([routine], MILLIS)[0]
+
+    def run():
+        sketch_output.writePretty(arr, io.StringIO())
+
+    return run
+
+
+def sketchSetup(encoding):
+    def setup(servos, seconds):
+        show = makeShow(servos, seconds)
+        file_name = workFile('bench.ino')
+
+        def run():
+            template_dict = sketch_output.templateDict(
+                [routine.name for routine in show.routines],
+                [routine.pin for routine in show.routines],
+                [routine.ys for routine in show.routines],
+                'None', 'pins', encoding, MILLIS)
+            sketch_output.writeSketch(file_name, 'pins', template_dict)
+
+        return run
+
+    return setup
+
+
+for encoding in sketch_output.ENCODINGS:
+    benchmark('sketch_' + encoding)(sketchSetup(encoding))
+
+
+@benchmark('servo_file_save')
+def benchSave(servos, seconds):
+    show = makeShow(servos, seconds)
+    file_name = workFile('bench.servo')
+    return lambda: servo_file.save(file_name, show)
+
+
+@benchmark('servo_file_load')
+def benchLoad(servos, seconds):
+    file_name = workFile('bench.servo')
+    servo_file.save(file_name, makeShow(servos, seconds))
+    return lambda: servo_file.load(file_name)
+
+
+@benchmark('legacy_load')
+def benchLegacyLoad(servos, seconds):
+    '''Files pickled with dill by older versions'''
+
+    import dill
+
+    file_name = workFile('bench.servo')
+    with open(file_name, 'wb') as writer:
+        dill.dump(makeShow(servos, seconds).toSettings(), writer)
+
+    return lambda: servo_file.load(file_name)
+
+
+def makePlot(seconds):
+    '''servo_out's Plot on the Agg canvas, holding a synthetic routine'''
+
+    from drag_redraw import makePlot
+
+    plot = makePlot(seconds)
+    plot.routine.splice(0, len(plot.routine), makeShow(1, seconds).routines[0].ys)
+    plot.update()
+
+    return plot
+
+
+@benchmark('plot_draw', per_servos=False)
+def benchPlotDraw(servos, seconds):
+    plot = makePlot(seconds)
+
+    def run():
+        plot.drawPlot()
+        plot.fig.canvas.draw()
+
+    return run
+
+
+@benchmark('plot_update', per_servos=False)
+def benchPlotUpdate(servos, seconds):
+    '''Redraw after every node of the routine changed, e.g. loading'''
+
+    plot = makePlot(seconds)
+
+    def run():
+        plot.nodesChanged()
+        plot.update()
+
+    return run
+
+
+@benchmark('frame_parser')
+def benchFrameParser(servos, seconds):
+    data = makeFrames(servos, seconds)
+    chunks = [data[start:start+READ_BYTES]
+              for start in range(0, len(data), READ_BYTES)]
+
+    def run():
+        parser = serial_reader.FrameParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+
+    return run
+
+
+@benchmark('resampler')
+def benchResampler(servos, seconds):
+    frames = [(millis / 1000, sequence, millis, angles) for sequence, millis, angles
+              in serial_reader.FrameParser().feed(makeFrames(servos, seconds))]
+    per_drain = DRAIN_MS // SAMPLE_MS
+    batches = [frames[start:start+per_drain]
+               for start in range(0, len(frames), per_drain)]
+
+    def run():
+        resampler = sample_resampler.Resampler(servos,
+            frame_period=SAMPLE_MS/1000)
+        for batch in batches:
+            resampler.feed(batch)
+
+    return run
+
+
+def timeCall(func, repeat):
+    '''
+    Seconds per call of func for each of repeat runs. A run calls func
+    enough times to take MIN_RUN_S, the first call only warms up
+    '''
+
+    start = perf_counter()
+    func()
+    first = perf_counter() - start
+
+    number = max(int(MIN_RUN_S / first), 1) if first > 0 else 1000
+    if first > 1:
+        # Slow calls are steady enough with fewer runs
+        repeat = min(repeat, 3)
+
+    times = []
+    for run in range(repeat):
+        start = perf_counter()
+        for call in range(number):
+            func()
+        times.append((perf_counter() - start) / number)
+
+    return times, number
+
+
+def gitCommit():
+    '''Commit the tree is at, with '+' if it has changes'''
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain',
+            '--untracked-files=no'], cwd=ROOT, stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ('+' if dirty else '')
+
+
+def runAll(servo_counts, seconds_list, repeat, keyword=None):
+    global _work_dir
+
+    with tempfile.TemporaryDirectory(prefix='servo_bench_') as _work_dir:
+        return runBenchmarks(servo_counts, seconds_list, repeat, keyword)
+
+
+def runBenchmarks(servo_counts, seconds_list, repeat, keyword=None):
+    results = []
+
+    for name, (setup, per_servos) in BENCHMARKS.items():
+        if keyword and keyword not in name:
+            continue
+
+        for servos in (servo_counts if per_servos else servo_counts[:1]):
+            for seconds in seconds_list:
+                try:
+                    func = setup(servos, seconds)
+                except ImportError as e:
+                    print('{:<18} skipped: {}'.format(name, e))
+                    break
+
+                times, number = timeCall(func, repeat)
+                result = {'name': name, 'servos': servos, 'seconds': seconds,
+                          'best_ms': min(times) * 1000,
+                          'median_ms': statistics.median(times) * 1000,
+                          'number': number, 'repeat': len(times)}
+                results.append(result)
+
+                print('{:<18} {:>2} servos {:>5} s {:10.3f} ms'.format(
+                    name, servos, seconds, result['best_ms']))
+
+    return results
+
+
+def key(result):
+    return result['name'], result['servos'], result['seconds']
+
+
+def compare(results, old_file, threshold=THRESHOLD):
+    '''Print each benchmark against old_file, False if any got slower'''
+
+    with open(old_file) as reader:
+        old = json.load(reader)
+    old_results = {key(result): result for result in old['results']}
+
+    print('\nAgainst {} ({})'.format(old_file, old.get('commit')))
+    ok = True
+    for result in results:
+        before = old_results.get(key(result))
+        if before is None:
+            continue
+
+        ratio = result['best_ms'] / before['best_ms']
+        slower = ratio > threshold
+        ok = ok and not slower
+
+        print('{:<18} {:>2} servos {:>5} s {:10.3f} -> {:10.3f} ms  x{:.2f}{}'.format(
+            *key(result), before['best_ms'], result['best_ms'], ratio,
+            '  SLOWER' if slower else ''))
+
+    return ok
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time export, interpolation, save/load, redraw and recording')
+    parser.add_argument('-o', '--output',
+        help='JSON file for the results (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', metavar='JSON',
+        help='results of another commit to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+        help='slowdown that fails the comparison (default: %(default)s)')
+    parser.add_argument('--quick', action='store_true',
+        help='only the smaller shows')
+    parser.add_argument('-k', dest='keyword',
+        help='only benchmarks whose name contains this')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+        help='runs of each benchmark, the best is compared (default: %(default)s)')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+
+    servo_counts, seconds_list = ((QUICK_SERVOS, QUICK_SECONDS) if args.quick
+                                  else (SERVOS, SECONDS))
+    results = runAll(servo_counts, seconds_list, args.repeat, args.keyword)
+
+    commit = gitCommit()
+    output = args.output
+    if output is None:
+        name = commit[:10] + ('-dirty' if commit.endswith('+') else '') if commit else 'unknown'
+        output = os.path.join(ROOT, 'benchmarks', 'results', name + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, 'w') as writer:
+        json.dump({'commit': commit,
+                   'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'python': platform.python_version(),
+                   'numpy': np.__version__,
+                   'machine': platform.platform(),
+                   'results': results}, writer, indent=1)
+    print('\nResults written to {}'.format(output))
+
+    if args.compare:
+        return compare(results, args.compare, args.threshold)
+
+    return True
+
+
+if __name__ == '__main__':
+
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,94 @@
+'''
+Time importing each app module with python -X importtime, against a
+budget. Modules that should only be imported when needed must not be
+imported at startup at all
+
+    python benchmarks/import_time.py [repeat]
+'''
+
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Most milliseconds importing each module may take, the best of repeat runs
+BUDGET_MS = {'servo_out': 300, 'servo_in': 300, 'servo_export': 300}
+
+# Imported on demand: plots, exporting, old dill files
+DEFERRED = {
+    'servo_out': ('matplotlib', 'jinja2', 'dill'),
+    'servo_in': ('matplotlib', 'jinja2', 'dill'),
+    'servo_export': ('tkinter', 'matplotlib', 'dill', 'PIL'),
+}
+
+
+def importTimes(module):
+    '''
+    (name, nesting depth, self us, cumulative us) of everything
+    imported by a fresh interpreter importing module
+    '''
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+        'import {}'.format(module)], cwd=ROOT, stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError('importing {} failed:\n{}'.format(module, result.stderr))
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            own, cumulative, name = line[len('import time:'):].split('|')
+            own, cumulative = int(own), int(cumulative)
+        except ValueError:
+            continue    # Column headings
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), depth, own, cumulative))
+
+    return times
+
+
+def measure(module, repeat):
+    '''Best cumulative ms of module, its slowest direct imports and top-level packages'''
+
+    best = None
+    for run in range(repeat):
+        times = importTimes(module)
+        total = [cumulative for name, depth, own, cumulative in times
+                 if name == module and depth == 0][0]
+        if best is None or total < best[0]:
+            best = (total, times)
+
+    total, times = best
+    children = sorted(((cumulative, name) for name, depth, own, cumulative in times
+                       if depth == 1), reverse=True)
+    packages = {name.split('.')[0] for name, depth, own, cumulative in times}
+
+    return total / 1000, children[:5], packages
+
+
+def main(repeat=5):
+    ok = True
+
+    for module, budget in BUDGET_MS.items():
+        total_ms, slowest, packages = measure(module, repeat)
+        early = sorted(packages.intersection(DEFERRED[module]))
+
+        print('{:<14} {:7.1f} ms (budget {} ms)'.format(module, total_ms, budget))
+        for cumulative, name in slowest:
+            print('    {:<30} {:7.1f} ms'.format(name, cumulative / 1000))
+        if early:
+            print('    imported at startup: {}'.format(', '.join(early)))
+
+        ok = ok and total_ms <= budget and not early
+
+    return ok
+
+
+if __name__ == '__main__':
+
+    args = [int(arg) for arg in sys.argv[1:2]]
+    sys.exit(0 if main(*args) else 1)
@@ -0,0 +1,253 @@
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+import routine_model
+import servo_file
+
+
+# Every edit of a show is one line of JSON appended to the journal.
+# Every so often the whole show is written to the snapshot, with the
+# number of the last edit it holds, and the journal starts again.
+# After a crash, the snapshot plus the edits after it in the journal
+# give back the show as it was
+JOURNAL_SUFFIX = '.journal'
+SNAPSHOT_SUFFIX = '.snapshot'
+
+
+class Journal():
+    '''
+    Records the edits of a routine_model.Show as they happen. Lines are
+    written and flushed on a background thread, so an edit only costs
+    the UI thread a small JSON line
+    '''
+
+    def __init__(self, base_name, snapshot_every=2000):
+        self.journal_file = base_name + JOURNAL_SUFFIX
+        self.snapshot_file = base_name + SNAPSHOT_SUFFIX
+        self.snapshot_every = snapshot_every    # Edits between snapshots
+
+        self.show = None
+        self.sequence = 0          # Number of the last edit recorded
+        self.since_snapshot = 0
+        self.unsaved = False       # Edits since the show was last saved
+        self.info = {}             # routine -> name/pin/limits last recorded
+
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def hasWork(self):
+        '''True if a previous session left edits that were never saved'''
+
+        return any(os.path.exists(file_name) and os.path.getsize(file_name)
+                   for file_name in (self.journal_file, self.snapshot_file))
+
+    def recover(self):
+        '''
+        Show rebuilt from the snapshot and the journal. A line cut short
+        by the crash, and anything after it, is ignored
+        '''
+
+        show = routine_model.Show()
+        sequence = 0
+        if os.path.exists(self.snapshot_file):
+            show = servo_file.load(self.snapshot_file)
+            sequence = servo_file.readHeader(self.snapshot_file).get(
+                'journal_sequence', 0)
+
+        try:
+            with open(self.journal_file, 'rb') as reader:
+                for line in reader:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record['seq'] > sequence:
+                        replay(show, record)
+        except FileNotFoundError:
+            pass
+
+        return show
+
+    def start(self, show, unsaved=False):
+        '''
+        Record edits of show from now on, dropping whatever was there.
+        unsaved is True if show itself was never saved, e.g. it was
+        recovered, so it is kept if the app closes without saving
+        '''
+
+        self.show = show
+        show.observe(self.onShowChanged)
+        for routine in show.routines:
+            routine.observe(self.onRoutineChanged)
+            self.info[routine] = self.routineInfo(routine)
+
+        self._writer = threading.Thread(target=self.writeRecords, daemon=True)
+        self._writer.start()
+
+        self.snapshot()
+        self.unsaved = unsaved
+
+    def close(self):
+        '''
+        Finish writing. Nothing is left to recover if the show was
+        saved after its last edit
+        '''
+
+        if self._writer is None:
+            return
+
+        self.show.unobserve(self.onShowChanged)
+        for routine in self.show.routines:
+            routine.unobserve(self.onRoutineChanged)
+
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
+        if not self.unsaved:
+            for file_name in (self.journal_file, self.snapshot_file):
+                try:
+                    os.remove(file_name)
+                except FileNotFoundError:
+                    pass
+
+    def saved(self):
+        '''
+        The show is the same as a file, it was saved or just loaded.
+        A new snapshot keeps the journal short
+        '''
+
+        if self._writer is None:
+            return
+
+        self.snapshot()
+        self.unsaved = False
+
+    @staticmethod
+    def routineInfo(routine):
+        return (routine.name, routine.pin, routine.lower_limit,
+                routine.upper_limit)
+
+    def touch(self, routine):
+        '''Record the routine's name, pin and limits if they changed'''
+
+        if self._writer is None:
+            return
+
+        info = self.routineInfo(routine)
+        if self.info.get(routine) != info:
+            self.info[routine] = info
+            self.record({'op': 'info', 'servo': self.show.routines.index(routine),
+                         'name': info[0], 'pin': info[1],
+                         'lower': info[2], 'upper': info[3]})
+
+    def onShowChanged(self, show, action, index, routine):
+        if action == 'add':
+            routine.observe(self.onRoutineChanged)
+            self.info[routine] = self.routineInfo(routine)
+            self.record({'op': 'add', 'servo': index, 'name': routine.name,
+                         'pin': routine.pin, 'lower': routine.lower_limit,
+                         'upper': routine.upper_limit,
+                         'values': routine.ys.tobytes().hex()})
+        else:
+            routine.unobserve(self.onRoutineChanged)
+            self.info.pop(routine, None)
+            self.record({'op': 'remove', 'servo': index})
+
+    def onRoutineChanged(self, routine, start, old, new):
+        self.touch(routine)
+        self.record({'op': 'splice', 'servo': self.show.routines.index(routine),
+                     'start': start, 'stop': start+len(old),
+                     'values': new.tobytes().hex()})
+
+    def record(self, record):
+        self.sequence += 1
+        record['seq'] = self.sequence
+        self._queue.put(json.dumps(record) + '\n')
+
+        self.unsaved = True
+        self.since_snapshot += 1
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        '''Queue a copy of the whole show, the journal starts again after it'''
+
+        routines = [routine_model.Routine(routine.name, routine.ys.copy(),
+                        routine.pin, routine.lower_limit, routine.upper_limit)
+                    for routine in self.show.routines]
+        show = routine_model.Show(routines, self.show.button,
+            self.show.output_type, self.show.encoding, self.show.millis)
+
+        self._queue.put((show, self.sequence))
+        self.since_snapshot = 0
+
+    def writeRecords(self):
+        '''Writer thread, appends lines and writes snapshots in order'''
+
+        writer = open(self.journal_file, 'a')
+
+        while True:
+            items = [self._queue.get()]
+            # Everything waiting goes out with one flush
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                for item in items:
+                    if item is None:
+                        writer.close()
+                        return
+                    elif isinstance(item, str):
+                        writer.write(item)
+                    else:
+                        writer.close()
+                        self.writeSnapshot(*item)
+                        # Edits already in the snapshot are not needed
+                        writer = open(self.journal_file, 'w')
+
+                writer.flush()
+                os.fsync(writer.fileno())
+            except OSError as e:
+                # Autosave stops, the show can still be saved by hand
+                print('Autosave failed:', e)
+                writer.close()
+                return
+
+    def writeSnapshot(self, show, sequence):
+        temp_file = self.snapshot_file + '.tmp'
+        servo_file.save(temp_file, show, {'journal_sequence': sequence})
+        os.replace(temp_file, self.snapshot_file)
+
+
+def values(record):
+    return np.frombuffer(bytes.fromhex(record['values']), dtype=np.uint8)
+
+
+def replay(show, record):
+    '''Apply one journal record to show'''
+
+    op = record['op']
+    if op == 'add':
+        show.add(routine_model.Routine(record['name'],
+            values(record), record['pin'],
+            record['lower'], record['upper']), record['servo'])
+        return
+
+    routine = show.routines[record['servo']]
+    if op == 'remove':
+        show.remove(routine)
+    elif op == 'splice':
+        routine.splice(record['start'], record['stop'], values(record))
+    elif op == 'info':
+        routine.name = record['name']
+        routine.pin = record['pin']
+        routine.setLimits(record['lower'], record['upper'])
@@ -0,0 +1,233 @@
+
+import bisect
+import collections
+import functools
+import json
+import platform
+import time
+
+from time import monotonic, perf_counter
+
+
+# Nothing is recorded until enable(), so timing costs the hot paths
+# one flag check while it is off
+_enabled = False
+
+# Upper edges of the histogram buckets in seconds, 10 us to about 7 s,
+# each half again as wide as the one before
+BUCKETS = [1e-5 * 2**(i/2) for i in range(40)]
+RATE_WINDOW = 1.0   # Seconds that rates are worked out over
+
+_registry = {}      # name -> Timer, Counter or Gauge
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def isEnabled():
+    return _enabled
+
+
+class Timer():
+    '''
+    Histogram of how long each call of something took. Also a context
+    manager, which must only be used by one thread at a time
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(BUCKETS) + 1)    # Last is anything slower
+        self.count = 0
+        self.total = 0
+        self.longest = 0
+        self.last = 0
+        self.recent = collections.deque(maxlen=1024)   # When calls ended
+        self._start = None
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.longest = max(self.longest, seconds)
+        self.last = seconds
+        self.recent.append(monotonic())
+
+    def __enter__(self):
+        self._start = perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._start is not None:
+            self.record(perf_counter() - self._start)
+
+    def percentile(self, percent):
+        '''Upper edge of the bucket holding this percentile, in seconds'''
+
+        if not self.count:
+            return 0
+
+        wanted = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= wanted:
+                break
+
+        return BUCKETS[index] if index < len(BUCKETS) else self.longest
+
+    def rate(self):
+        '''Calls per second lately'''
+
+        return recentRate(self.recent)
+
+    def summary(self):
+        return {'count': self.count,
+                'mean_ms': self.total / self.count * 1000 if self.count else 0,
+                'p50_ms': self.percentile(50) * 1000,
+                'p95_ms': self.percentile(95) * 1000,
+                'p99_ms': self.percentile(99) * 1000,
+                'max_ms': self.longest * 1000,
+                'per_second': self.rate()}
+
+    def toDict(self):
+        # Only buckets that were used, by upper edge in ms
+        histogram = {('{:.3f}'.format(BUCKETS[index] * 1000)
+                      if index < len(BUCKETS) else 'slower'): count
+                     for index, count in enumerate(self.counts) if count}
+        return dict(self.summary(), histogram=histogram)
+
+
+class Counter():
+    '''Events that happen many at a time, e.g. samples read'''
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.recent = collections.deque(maxlen=1024)   # (time, events)
+
+    def add(self, events=1):
+        if not _enabled:
+            return
+
+        self.total += events
+        self.recent.append((monotonic(), events))
+
+    def rate(self):
+        '''Events per second lately'''
+
+        now = monotonic()
+        events = [count for when, count in self.recent
+                  if now - when <= RATE_WINDOW]
+        return sum(events) / RATE_WINDOW
+
+    def toDict(self):
+        return {'total': self.total, 'per_second': self.rate()}
+
+
+class Gauge():
+    '''Latest value of something, e.g. how full a queue is'''
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.value = 0
+        self.highest = 0
+
+    def set(self, value):
+        if not _enabled:
+            return
+
+        self.value = value
+        self.highest = max(self.highest, value)
+
+    def toDict(self):
+        return {'value': self.value, 'highest': self.highest}
+
+
+def recentRate(times):
+    now = monotonic()
+    return sum(1 for when in times if now - when <= RATE_WINDOW) / RATE_WINDOW
+
+
+def _get(cls, name):
+    item = _registry.get(name)
+    if item is None:
+        item = _registry[name] = cls(name)
+    elif not isinstance(item, cls):
+        raise TypeError('{} is a {}, not a {}'.format(name,
+            type(item).__name__, cls.__name__))
+
+    return item
+
+
+def timer(name):
+    return _get(Timer, name)
+
+
+def counter(name):
+    return _get(Counter, name)
+
+
+def gauge(name):
+    return _get(Gauge, name)
+
+
+def timed(name):
+    '''Decorator that records every call of a function in timer(name)'''
+
+    def decorate(func):
+        record = timer(name).record
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def items(cls=None):
+    '''Everything registered, of type cls if given, sorted by name'''
+
+    return [_registry[name] for name in sorted(_registry)
+            if cls is None or isinstance(_registry[name], cls)]
+
+
+def reset():
+    for item in _registry.values():
+        item.reset()
+
+
+def snapshot():
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'enabled': _enabled,
+            'timers': {item.name: item.toDict() for item in items(Timer)},
+            'counters': {item.name: item.toDict() for item in items(Counter)},
+            'gauges': {item.name: item.toDict() for item in items(Gauge)}}
+
+
+def dump(file_name):
+    '''Write everything recorded to file_name as JSON, for bug reports'''
+
+    with open(file_name, 'w') as writer:
+        json.dump(snapshot(), writer, indent=1)
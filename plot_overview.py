@@ -0,0 +1,143 @@
+
+import numpy as np
+
+
+class Envelope():
+    '''
+    Min and max of a routine over columns of width nodes each. width
+    is a power of two, so a growing routine only merges pairs of
+    columns instead of starting over
+    '''
+
+    def __init__(self, columns):
+        self.columns = max(columns, 1)     # Most columns to keep
+        self.width = 1
+        self.length = 0
+        self.lo = np.empty(0, dtype=np.uint8)
+        self.hi = np.empty(0, dtype=np.uint8)
+
+    def widthFor(self, length):
+        width = 1
+        while -(-length // width) > self.columns:
+            width *= 2
+        return width
+
+    def update(self, ys, start=0, end=None):
+        '''
+        Recompute the columns holding nodes start to end of ys,
+        the whole routine when end is None
+        '''
+
+        length = len(ys)
+
+        if end is None:
+            self.width = self.widthFor(length)
+            start = 0
+        elif length < self.length:
+            # Shrinking can need narrower columns
+            return self.update(ys)
+        else:
+            # Grown routine keeps its columns, merging until it fits again
+            while -(-length // self.width) > self.columns:
+                self.merge()
+
+        num_columns = -(-length // self.width)
+        first = min(start, self.length, length) // self.width
+        self.resize(num_columns)
+        self.length = length
+
+        if first >= num_columns:
+            return
+
+        # Slice first, so a list routine only converts what changed
+        values = np.asarray(ys[first*self.width:], dtype=np.uint8)
+        if end is not None:
+            last = min(-(-end // self.width), num_columns)
+            values = values[:(last-first)*self.width]
+        else:
+            last = num_columns
+
+        bounds = np.arange(0, len(values), self.width)
+        self.lo[first:last] = np.minimum.reduceat(values, bounds)
+        self.hi[first:last] = np.maximum.reduceat(values, bounds)
+
+    def merge(self):
+        '''Halve the number of columns by doubling their width'''
+
+        if len(self.lo) % 2:
+            # Odd column out pairs with itself
+            self.lo = np.append(self.lo, self.lo[-1])
+            self.hi = np.append(self.hi, self.hi[-1])
+
+        self.lo = self.lo.reshape(-1, 2).min(axis=1)
+        self.hi = self.hi.reshape(-1, 2).max(axis=1)
+        self.width *= 2
+
+    def resize(self, num_columns):
+        for name in ('lo', 'hi'):
+            arr = getattr(self, name)
+            if len(arr) != num_columns:
+                grown = np.zeros(num_columns, dtype=np.uint8)
+                keep = min(len(arr), num_columns)
+                grown[:keep] = arr[:keep]
+                setattr(self, name, grown)
+
+    def outline(self):
+        '''
+        x and y of one line going down and up every column,
+        at the middle of the nodes it covers
+        '''
+
+        centres = np.arange(len(self.lo))*self.width + (self.width-1)/2
+        xs = np.repeat(np.minimum(centres, self.length-1), 2)
+        ys = np.column_stack((self.lo, self.hi)).ravel()
+
+        return xs, ys
+
+
+class Overview():
+    '''
+    Strip under a plot showing the whole routine, with the part in
+    the main plot highlighted. Clicking it calls jump with the node
+    that was clicked
+    '''
+
+    def __init__(self, fig, main_ax, jump=None):
+        # Envelope is used without matplotlib, e.g. by show_library
+        from matplotlib.patches import Rectangle
+
+        self.jump = jump
+
+        # Same left and right edges as the main plot
+        main_box = main_ax.get_position()
+        self.ax = fig.add_axes([main_box.x0, 0.03, main_box.width, 0.08])
+        self.ax.set_ylim([-10, 190])
+        self.ax.set_xticks([])
+        self.ax.set_yticks([])
+
+        # One column per pixel across the strip
+        columns = int(self.ax.get_window_extent().width)
+        self.envelope = Envelope(columns)
+
+        self.line, = self.ax.plot([], [], color='orange', linewidth=1)
+        self.view = Rectangle((0, -10), 0, 200, alpha=.35,
+            facecolor='lightskyblue')
+        self.ax.add_patch(self.view)
+
+    def update(self, ys, start=0, end=None):
+        '''Redo the columns of nodes start to end, all of them if end is None'''
+
+        self.envelope.update(ys, start, end)
+
+        self.line.set_data(*self.envelope.outline())
+        self.ax.set_xlim([-.5, max(self.envelope.length, 2) - .5])
+
+    def showView(self, first, last):
+        '''Highlight nodes first to last, what the main plot shows'''
+
+        self.view.set_x(first - .5)
+        self.view.set_width(last - first + 1)
+
+    def onClick(self, event):
+        if event.inaxes is self.ax and event.button == 1 and self.jump:
+            self.jump(event.xdata)
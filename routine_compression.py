@@ -0,0 +1,114 @@
+
+import numpy as np
+
+
+# Longest run that fits in one byte of the compressed array
+MAX_RUN = 255
+
+
+def rampValues(start, end, count):
+    '''
+    Values played for one run, from the step after start up to end.
+    Same integer math as nextValue() in decoder_template.txt:
+    round half away from zero, C division truncates toward zero
+    '''
+
+    delta = int(end) - int(start)
+    steps = np.arange(1, count+1, dtype=np.int64)
+
+    num = 2*delta*steps + (count if delta >= 0 else -count)
+    return int(start) + np.sign(num) * (np.abs(num) // (2*count))
+
+
+def longestRun(samples, pos, max_run=MAX_RUN):
+    '''Most steps from samples[pos] that one straight run reproduces exactly'''
+
+    start = samples[pos]
+    window = samples[pos+1:pos+1+max_run] - start
+    steps = np.arange(1, len(window)+1)
+
+    # Slopes that still round to every earlier step of the run
+    lows = np.maximum.accumulate((window - 0.5) / steps)
+    highs = np.minimum.accumulate((window + 0.5) / steps)
+
+    slopes = window / steps
+    fits = np.ones(len(window), dtype=bool)
+    fits[1:] = (slopes[1:] >= lows[:-1] - 1e-9) & (slopes[1:] <= highs[:-1] + 1e-9)
+
+    # Check candidates longest first against the decoder's own rounding
+    for count in np.flatnonzero(fits)[::-1] + 1:
+        if np.array_equal(rampValues(start, window[count-1] + start, count),
+                          samples[pos+1:pos+1+count]):
+            return int(count)
+
+    return 1
+
+
+def compressRoutine(samples, max_run=MAX_RUN):
+    '''
+    Encode a routine as [first value, steps, end value, steps, end value...]
+    where each (steps, end value) pair is a straight ramp from the
+    previous end value. Lossless, see expandRoutine()
+    '''
+
+    samples = np.asarray(samples, dtype=np.int64)
+    if len(samples) == 0:
+        return np.empty(0, dtype=np.uint8)
+
+    encoded = [samples[0]]
+    pos = 0
+
+    while pos < len(samples) - 1:
+        count = longestRun(samples, pos, max_run)
+        encoded += [count, samples[pos+count]]
+        pos += count
+
+    return np.array(encoded, dtype=np.uint8)
+
+
+def expandRoutine(encoded):
+    '''Python reference of the sketch decoder, rebuilds every sample'''
+
+    encoded = np.asarray(encoded, dtype=np.int64)
+    if len(encoded) == 0:
+        return np.empty(0, dtype=np.uint8)
+
+    parts = [encoded[:1]]
+    value = encoded[0]
+
+    for count, end in zip(encoded[1::2], encoded[2::2]):
+        parts.append(rampValues(value, end, count))
+        value = end
+
+    return np.concatenate(parts).astype(np.uint8)
+
+
+def routineLength(encoded):
+    '''Number of samples a compressed routine expands to'''
+
+    if len(encoded) == 0:
+        return 0
+
+    return 1 + int(np.sum(np.asarray(encoded[1::2], dtype=np.int64)))
+
+
+def interpolateKeyframes(keyframes, steps):
+    '''
+    Python reference of keyframeValue() in decoder_template.txt,
+    every sample between keyframes rounded half to even in integer math.
+    Matches inBetweeners() whenever steps is odd, the only case where
+    a sample can never land exactly halfway
+    '''
+
+    keys = np.asarray(keyframes, dtype=np.int64)
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.uint8)
+
+    starts = keys[:-1, np.newaxis]
+    num = (keys[1:, np.newaxis] - starts) * np.arange(steps)
+
+    whole, rest = np.divmod(np.abs(num), steps)
+    whole += (2*rest > steps) | ((2*rest == steps) & (whole % 2 == 1))
+
+    values = starts + np.sign(num)*whole
+    return np.concatenate([values.ravel(), keys[-1:]]).astype(np.uint8)
@@ -0,0 +1,182 @@
+
+import numpy as np
+
+
+class Routine():
+    '''
+    Keyframes of one servo, 2 per second, held in a uint8 buffer with
+    room to grow. Every change goes through splice(), which tells each
+    observer (routine, start, old, new): the values old at start were
+    replaced by new
+    '''
+
+    __slots__ = ('name', 'pin', 'lower_limit', 'upper_limit',
+                 '_values', '_length', '_observers')
+
+    def __init__(self, name, values=(), pin=0, lower_limit=0, upper_limit=179):
+        self.name = name
+        self.pin = pin
+        # For keeping values within range of servo degrees
+        self.lower_limit = lower_limit
+        self.upper_limit = upper_limit
+
+        self._values = self.confine(values)
+        self._length = len(self._values)
+        self._observers = []
+
+    @property
+    def ys(self):
+        '''Keyframes as a uint8 array, a view that changes with the routine'''
+        return self._values[:self._length]
+
+    @property
+    def seconds(self):
+        return max(self._length - 1, 0) // 2
+
+    def __len__(self):
+        return self._length
+
+    def observe(self, callback):
+        self._observers.append(callback)
+
+    def unobserve(self, callback):
+        if callback in self._observers:
+            self._observers.remove(callback)
+
+    def confine(self, values):
+        '''values as uint8, kept within the limits'''
+
+        values = np.asarray(values)
+        if values.dtype != np.uint8:
+            values = np.rint(values)
+
+        return np.clip(values, self.lower_limit,
+                       self.upper_limit).astype(np.uint8)
+
+    def reserve(self, capacity):
+        '''Grow the buffer to hold capacity values without reallocating'''
+
+        if capacity > len(self._values):
+            values = np.empty(capacity, dtype=np.uint8)
+            values[:self._length] = self.ys
+            self._values = values
+
+    def splice(self, start, stop, new):
+        '''Replace keyframes start to stop with new, which may differ in length'''
+
+        new = self.confine(new)
+        old = self.ys[start:stop].copy()
+        stop = start + len(old)
+        end = self._length + len(new) - len(old)
+
+        if end > len(self._values):
+            self.reserve(max(end, 2*len(self._values)))
+
+        # Overlapping slices are copied safely by numpy
+        self._values[start+len(new):end] = self._values[stop:self._length]
+        self._values[start:start+len(new)] = new
+        self._length = end
+
+        for callback in list(self._observers):
+            callback(self, start, old, new)
+
+    def set(self, index, value):
+        self.splice(index, index+1, [value])
+
+    def insert(self, index, values):
+        self.splice(index, index, values)
+
+    def append(self, values):
+        self.splice(self._length, self._length, values)
+
+    def delete(self, start, stop):
+        self.splice(start, stop, [])
+
+    def setLimits(self, lower_limit, upper_limit):
+        '''New limits, keyframes outside them are moved inside'''
+
+        self.lower_limit = lower_limit
+        self.upper_limit = upper_limit
+
+        ys = self.ys
+        if len(ys) and (ys.min() < lower_limit or ys.max() > upper_limit):
+            self.splice(0, self._length, ys)
+
+
+class Show():
+    '''
+    Every servo's routine and the options for the output sketch.
+    Observers are told (show, action, index, routine) when a routine
+    is added or removed, action being 'add' or 'remove'
+    '''
+
+    __slots__ = ('routines', 'button', 'output_type', 'encoding', 'millis',
+                 '_observers')
+
+    def __init__(self, routines=(), button='None', output_type='i2c',
+                 encoding='full', millis=15):
+        self.routines = list(routines)
+        self.button = button            # Pin # of start button, or 'None'
+        self.output_type = output_type  # 'i2c' or 'pins'
+        self.encoding = encoding        # See sketch_output.ENCODINGS
+        self.millis = millis            # Delay between each inBetweener value
+        self._observers = []
+
+    @property
+    def seconds(self):
+        return self.routines[0].seconds if self.routines else 0
+
+    def observe(self, callback):
+        self._observers.append(callback)
+
+    def unobserve(self, callback):
+        if callback in self._observers:
+            self._observers.remove(callback)
+
+    def add(self, routine, index=None):
+        '''Add routine at index, at the end if index is None'''
+
+        if index is None:
+            index = len(self.routines)
+        self.routines.insert(index, routine)
+
+        for callback in list(self._observers):
+            callback(self, 'add', index, routine)
+
+    def remove(self, routine):
+        index = self.routines.index(routine)
+        del self.routines[index]
+
+        for callback in list(self._observers):
+            callback(self, 'remove', index, routine)
+
+    def toSettings(self):
+        '''
+        Dictionary the apps load, names/pins/keyframes/limits
+        of each servo
+        '''
+
+        return {
+            'seconds' : self.seconds,
+            'plot_pages' : [[routine.name, routine.pin, routine.ys.tolist(),
+                             [routine.lower_limit, routine.upper_limit]]
+                            for routine in self.routines],
+            'button_#' : self.button,
+            'output_type': self.output_type,
+            'encoding': self.encoding
+        }
+
+    @classmethod
+    def fromSettings(cls, settings):
+        '''Show from a dictionary made by toSettings()'''
+
+        routines = []
+        for page in settings['plot_pages']:
+            name, pin, values = page[:3]
+            # Limits were not saved by older versions
+            limits = page[3] if len(page) > 3 else (0, 179)
+            routines.append(Routine(name, values, pin, *limits))
+
+        # Files saved before compression existed have no encoding
+        return cls(routines, settings['button_#'], settings['output_type'],
+                   settings.get('encoding', 'full'))
@@ -39,33 +39,92 @@ const int SERVOMAX = 525;
 // Wheter or not to send values over serial
 boolean RECORD_FLAG = false;
 
-long prev_write;
-const int delay_time = 500;
+// servo_in.py places frames on its half second grid by the millis()
+// sent with them, so they can be sent faster than that. Must match sample_ms
+unsigned long prev_write;
+const int delay_time = 20;
+
+// Must match baud_rate in servo_in.py
+const long BAUD_RATE = 115200;
+
+// Values are sent as binary frames, see serial_reader.py
+//   sync, version, sequence (2 bytes, low first), millis() when the
+//   angles were read (4 bytes, low first), servo count,
+//   one byte per angle, CRC8 of everything after the sync byte
+const byte FRAME_SYNC = 0xA5;
+const byte FRAME_VERSION = 2;
+unsigned int frame_seq = 0;
+
+byte ANGLES[sizeof(POTS) / sizeof(int)];
+unsigned long angles_millis;
+
+
+// CRC-8 with polynomial 0x07, same as crc8() in serial_reader.py
+byte crc8(byte crc, byte data)
+{
+  crc ^= data;
+  for (byte bit=0; bit<8; bit++)
+  {
+    crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : (crc << 1);
+  }
+  return crc;
+}
+
+
+// Write one byte of a frame and add it to the frame's CRC
+void writeFrameByte(byte data, byte &crc)
+{
+  Serial.write(data);
+  crc = crc8(crc, data);
+}
+
+
+// Send the latest angles of every servo as one frame
+void sendFrame()
+{
+  byte crc = 0;
+  
+  Serial.write(FRAME_SYNC);
+  writeFrameByte(FRAME_VERSION, crc);
+  writeFrameByte(lowByte(frame_seq), crc);
+  writeFrameByte(highByte(frame_seq), crc);
+  for (byte i=0; i<4; i++)
+  {
+    writeFrameByte((angles_millis >> (8*i)) & 0xFF, crc);
+  }
+  writeFrameByte(NUM_SERVOS, crc);
+  
+  for (byte i=0; i<NUM_SERVOS; i++)
+  {
+    writeFrameByte(ANGLES[i], crc);
+  }
+  Serial.write(crc);
+  
+  frame_seq++;
+}
 
 
 // Move the servos and if necessary, send values over serial
 void moveServos()
 {
-  int angle;
-  String all_values = "";
-  
   for (int i=0; i<NUM_SERVOS; i++)
   {
     int pot_value = analogRead(POTS[i]);
     int value = map(pot_value, 0, 1023, SERVOMIN, SERVOMAX);
-    int angle = map(pot_value, 0, 1023, 0, 179);
     
     servo_driver.setPin(i, value);
-    all_values = all_values + "," + angle;
+    ANGLES[i] = map(pot_value, 0, 1023, 0, 179);
   }
+  angles_millis = millis();
   
   // Send values over serial at appropriate interval, if recording
   if (RECORD_FLAG == true)
   {
-    if ((millis() - prev_write) > delay_time)
+    if ((millis() - prev_write) >= delay_time)
     {
-      Serial.println(all_values);
-      prev_write = millis();
+      sendFrame();
+      // Keep a steady rate instead of adding the loop time every frame
+      prev_write += delay_time;
     }
   }
 }
@@ -84,13 +143,15 @@ void checkForChar()
     {
       case 'r':  // Start 'recording', sending values over serial
         RECORD_FLAG = true;
+        frame_seq = 0;
+        prev_write = millis();
         break;
         
       case 's':  // Stop sending values
         RECORD_FLAG = false;
         break;
         
-      case 'n':  // Send names and number of servos to python
+      case 'n':  // Send names and number of servos to python, as text
         for (byte i=0; i<NUM_SERVOS; i++)
         {
           Serial.print(NAMES[i]);
@@ -106,7 +167,7 @@ void checkForChar()
 
 void setup()
 {
-  Serial.begin(9600);
+  Serial.begin(BAUD_RATE);
   
   servo_driver.begin();
   servo_driver.setPWMFreq(50);  // Analog servos run at ~60 Hz updates
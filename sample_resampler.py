@@ -0,0 +1,149 @@
+
+import numpy as np
+
+
+class Resampler():
+    '''
+    Turns frames from the Arduino into keyframes on a uniform grid,
+    every interval seconds from the first frame. Frames are placed by
+    the millis() the sketch read them at, so frames that arrive late
+    or in bursts, or are lost, do not shift the routine in time.
+    Values between two frames are linearly interpolated
+    '''
+
+    def __init__(self, num_servos, interval=0.5, frame_period=None):
+        self.num_servos = num_servos
+        self.interval = interval
+        self.frame_period = frame_period    # Seconds the sketch waits between frames
+
+        self.prev_time = None      # Last frame, the start of the next span
+        self.prev_angles = None
+        self.next_key = None       # Time of the next keyframe to produce
+
+        # Sketch's clock, millis() wraps around after 49 days
+        self.first_millis = None
+        self.prev_millis = None
+        self.wraps = 0
+
+        # For the report, times on the sketch's clock
+        self.first_time = None
+        self.last_time = None
+        self.host_first = None     # Host times the frames arrived, for clock drift
+        self.host_last = None
+        self.prev_sequence = None
+        self.received = 0
+        self.lost = 0              # Frames missing from the sequence numbers
+        self.skipped = 0           # Frames with the wrong number of angles
+        self.longest_gap = 0
+        self.gap_sum = 0
+        self.gap_squares = 0
+        self.keyframes = 0
+
+    def feed(self, frames):
+        '''
+        Keyframes reached by (timestamp, sequence, millis, angles)
+        frames, as a (keyframes x servos) uint8 array. timestamp is the
+        host time the frame arrived, it is only used for the report
+        '''
+
+        times = []
+        rows = []
+        for timestamp, sequence, millis, angles in frames:
+            if len(angles) != self.num_servos:
+                self.skipped += 1
+                continue
+
+            device_time = self.deviceTime(millis)
+            self.countFrame(timestamp, device_time, sequence)
+            times.append(device_time)
+            rows.append(angles)
+
+        if not rows:
+            return np.empty((0, self.num_servos), dtype=np.uint8)
+
+        times = np.array(times)
+        angles = np.frombuffer(b''.join(rows), dtype=np.uint8)
+        angles = angles.reshape(-1, self.num_servos).astype(np.float64)
+
+        if self.prev_time is None:
+            self.next_key = times[0]
+        else:
+            # Interpolate across the gap since the last batch as well
+            times = np.concatenate(([self.prev_time], times))
+            angles = np.concatenate((self.prev_angles[np.newaxis], angles))
+
+        count = int((times[-1] - self.next_key) // self.interval) + 1
+        keys = self.next_key + self.interval*np.arange(max(count, 0))
+
+        resampled = np.empty((len(keys), self.num_servos), dtype=np.uint8)
+        for servo in range(self.num_servos):
+            resampled[:, servo] = np.rint(np.interp(keys, times, angles[:, servo]))
+
+        self.prev_time = times[-1]
+        self.prev_angles = angles[-1]
+        self.next_key += self.interval*len(keys)
+        self.keyframes += len(keys)
+
+        return resampled
+
+    def deviceTime(self, millis):
+        '''Seconds on the sketch's clock since the first frame'''
+
+        if self.first_millis is None:
+            self.first_millis = millis
+        elif millis < self.prev_millis:
+            self.wraps += 1
+        self.prev_millis = millis
+
+        return (millis + self.wraps*2**32 - self.first_millis) / 1000
+
+    def countFrame(self, timestamp, device_time, sequence):
+        '''Track lost frames and the time between frames'''
+
+        self.received += 1
+
+        if self.host_first is None:
+            self.host_first = timestamp
+        self.host_last = timestamp
+
+        if self.first_time is None:
+            self.first_time = device_time
+        else:
+            gap = device_time - self.last_time
+            self.longest_gap = max(self.longest_gap, gap)
+            self.gap_sum += gap
+            self.gap_squares += gap*gap
+
+        if self.prev_sequence is not None:
+            # Sequence is 16 bits and wraps around
+            self.lost += ((sequence - self.prev_sequence) & 0xFFFF) - 1
+
+        self.prev_sequence = sequence
+        self.last_time = device_time
+
+    def report(self):
+        '''Text describing how regular the frames were'''
+
+        if self.received < 2:
+            return 'Received {} frames'.format(self.received)
+
+        elapsed = self.last_time - self.first_time
+        gaps = self.received - 1
+        mean = self.gap_sum / gaps
+        jitter = max(self.gap_squares/gaps - mean*mean, 0) ** .5
+
+        text = ('Recorded {:.1f} s, {} frames, {} lost, {} skipped\n'
+                'Frame interval {:.1f} ms, jitter {:.1f} ms, longest gap {:.0f} ms'.format(
+                elapsed, self.received, self.lost, self.skipped,
+                mean*1000, jitter*1000, self.longest_gap*1000))
+
+        if self.frame_period:
+            # How far off counting frames at the sketch's rate would have been
+            drift = (self.received + self.lost - 1)*self.frame_period - elapsed
+            text += '\nCounting frames would have drifted {:+.2f} s'.format(drift)
+
+        # Includes how late the first and last frames arrived
+        clock = elapsed - (self.host_last - self.host_first)
+        text += "\nArduino clock ran {:+.2f} s against the computer's".format(clock)
+
+        return text
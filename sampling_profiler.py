@@ -0,0 +1,130 @@
+
+import collections
+import json
+import os
+import sys
+import threading
+
+from time import perf_counter
+
+
+class SamplingProfiler():
+    '''
+    Looks at the stack of one thread, the thread that made the
+    profiler by default, every interval seconds from a background
+    thread. The thread being profiled runs as usual in between, so
+    stutter that only happens while dragging or recording can be
+    caught in the app itself. Stacks are saved for flame graphs
+    '''
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+
+        self.stacks = collections.Counter()    # Code objects, outermost first -> samples
+        self.samples = 0
+        self.elapsed = 0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def isRunning(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._started = perf_counter()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''Finish sampling, returns once the thread has ended'''
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed += perf_counter() - self._started
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                # Thread has ended
+                return
+
+            # Only code objects are kept, never frames and their locals
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def frameNames(self):
+        '''code object -> (function, file, first line) of everything sampled'''
+
+        names = {}
+        for stack in self.stacks:
+            for code in stack:
+                if code not in names:
+                    names[code] = (code.co_name, code.co_filename,
+                                   code.co_firstlineno)
+        return names
+
+    def writeCollapsed(self, file_name):
+        '''
+        One line per stack, 'outer;inner;innermost samples', as read by
+        flamegraph.pl, speedscope and most flame graph tools
+        '''
+
+        labels = {code: '{} ({}:{})'.format(name, os.path.basename(path), line)
+                  for code, (name, path, line) in self.frameNames().items()}
+
+        with open(file_name, 'w') as writer:
+            for stack, count in self.stacks.most_common():
+                writer.write('{} {}\n'.format(
+                    ';'.join(labels[code].replace(';', ':') for code in stack),
+                    count))
+
+    def writeSpeedscope(self, file_name, name='Servo Programmer'):
+        '''Stacks in speedscope's own format, weighted by seconds'''
+
+        names = self.frameNames()
+        index = {code: position for position, code in enumerate(names)}
+        seconds = self.elapsed / self.samples if self.samples else self.interval
+
+        stacks = self.stacks.most_common()
+        profile = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'sampling_profiler',
+            'shared': {'frames': [{'name': function, 'file': path, 'line': line}
+                                  for function, path, line in names.values()]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self.elapsed,
+                'samples': [[index[code] for code in stack]
+                            for stack, count in stacks],
+                'weights': [count * seconds for stack, count in stacks]}]}
+
+        with open(file_name, 'w') as writer:
+            json.dump(profile, writer)
+
+    def save(self, file_name, name='Servo Programmer'):
+        '''speedscope for .json files, collapsed stacks for anything else'''
+
+        if file_name.lower().endswith('.json'):
+            self.writeSpeedscope(file_name, name)
+        else:
+            self.writeCollapsed(file_name)
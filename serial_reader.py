@@ -0,0 +1,161 @@
+
+import collections
+import struct
+import threading
+
+from time import monotonic
+
+import serial
+
+import perf_timing
+
+
+# Each frame the Arduino sends while recording:
+#   sync, version, sequence (uint16 LE), millis() when the angles were
+#   read (uint32 LE), servo count, one byte per angle, CRC8
+# The CRC covers everything between the sync byte and itself
+SYNC_BYTE = 0xA5
+VERSION = 2
+HEADER = struct.Struct('<BBHIB')
+MAX_SERVOS = 16     # Anything more is a false sync byte
+
+_PARSE_TIMER = perf_timing.timer('serial.parse')
+_SAMPLES = perf_timing.counter('serial.samples')
+_QUEUE = perf_timing.gauge('serial.queue')
+
+
+def _crcTable(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x80 else (crc << 1)
+        table.append(crc & 0xFF)
+    return bytes(table)
+
+_CRC_TABLE = _crcTable()
+
+
+def crc8(data):
+    '''CRC-8 (polynomial 0x07, initial 0) like crc8() in the sample sketch'''
+
+    crc = 0
+    for byte in data:
+        crc = _CRC_TABLE[crc ^ byte]
+    return crc
+
+
+class FrameParser():
+    '''
+    Splits the raw byte stream into frames. Partial frames are kept
+    until the rest arrives, corrupt ones are skipped by finding the
+    next sync byte
+    '''
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.corrupt = 0        # Frames dropped for a bad header or CRC
+
+    def feed(self, data):
+        '''(sequence, millis, angles) of every whole frame in data, oldest first'''
+
+        self.buffer += data
+        frames = []
+        pos = 0
+
+        with memoryview(self.buffer) as view:
+            end = len(view)
+
+            while True:
+                start = self.buffer.find(SYNC_BYTE, pos)
+                if start < 0:
+                    pos = end
+                    break
+                if end - start < HEADER.size:
+                    pos = start
+                    break
+
+                _, version, sequence, millis, count = HEADER.unpack_from(view, start)
+                if version != VERSION or not 0 < count <= MAX_SERVOS:
+                    self.corrupt += 1
+                    pos = start + 1
+                    continue
+
+                frame_end = start + HEADER.size + count + 1
+                if frame_end > end:
+                    pos = start
+                    break
+
+                if crc8(view[start+1:frame_end-1]) != view[frame_end-1]:
+                    self.corrupt += 1
+                    pos = start + 1
+                    continue
+
+                frames.append((sequence, millis,
+                    view[start+HEADER.size:frame_end-1].tobytes()))
+                pos = frame_end
+
+        # Keep only what may be the start of the next frame
+        del self.buffer[:pos]
+
+        return frames
+
+
+class SerialReader(threading.Thread):
+    '''
+    Reads frames from the Arduino on a background thread and keeps them
+    in a bounded ring buffer, the GUI drains it with after()
+    '''
+
+    def __init__(self, port, max_samples=2048):
+        super().__init__(daemon=True)
+
+        self.port = port                # Open serial.Serial with a timeout
+        self.parser = FrameParser()
+        self.samples = collections.deque(maxlen=max_samples)
+        self.dropped = 0                # Oldest samples lost to a full buffer
+        self.error = None               # SerialException that ended reading
+
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Blocks at most the port timeout, so stop() is noticed
+                data = self.port.read(max(self.port.in_waiting, 1))
+            except serial.SerialException as e:
+                self.error = e
+                return
+            # Host time the frames arrived, only compared with the
+            # sketch's own clock to report drift
+            timestamp = monotonic()
+
+            with _PARSE_TIMER:
+                frames = self.parser.feed(data)
+                for sequence, millis, angles in frames:
+                    if len(self.samples) == self.samples.maxlen:
+                        self.dropped += 1
+                    self.samples.append((timestamp, sequence, millis, angles))
+
+            _SAMPLES.add(len(frames))
+            _QUEUE.set(len(self.samples))
+
+    def stop(self):
+        '''Finish reading, returns once the thread has ended'''
+
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def drain(self):
+        '''
+        (timestamp, sequence, millis, angles) of all frames read since
+        the last drain, oldest first
+        '''
+
+        drained = []
+        while True:
+            try:
+                drained.append(self.samples.popleft())
+            except IndexError:
+                return drained
@@ -0,0 +1,153 @@
+
+'''
+Write Arduino sketches for saved .servo files without opening the app
+
+    python servo_export.py shows/*.servo --output-type pins --button 7
+'''
+
+import argparse
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import servo_file
+import sketch_budget
+import sketch_output
+
+
+def checkShow(show, button, budget):
+    '''Messages for everything that stops show becoming a sketch, like outputSketch()'''
+
+    problems = []
+
+    if not show.routines:
+        problems.append('No servos')
+
+    if button != 'None':
+        try:
+            int(button)
+        except ValueError:
+            problems.append('Bad button pin #: {}'.format(button))
+
+    try:
+        pin_nums = [int(routine.pin) for routine in show.routines]
+    except (TypeError, ValueError):
+        problems.append('Check servo pin numbers')
+    else:
+        if len(pin_nums) != len(set(pin_nums)):
+            problems.append('Repeated servo pin numbers')
+
+    names = [routine.name for routine in show.routines]
+    if len(names) != len(set(names)):
+        problems.append('Repeated servo names')
+
+    return problems + budget.check(routines=[routine.ys for routine in show.routines])
+
+
+def exportFile(file_name, out_dir=None, output_type=None, button=None,
+               encoding=None, board='Uno'):
+    '''
+    Write the sketch for one .servo file. Options left as None come
+    from the file. Returns the sketch's file name and any problems,
+    nothing is written if there are problems
+    '''
+
+    try:
+        show = servo_file.load(file_name)
+    except Exception as e:
+        return None, ['Cannot load: {}'.format(e)]
+
+    output_type = output_type or show.output_type
+    encoding = encoding or show.encoding
+    button = str(button if button is not None else show.button)
+    if button.lower() == 'none':
+        button = 'None'
+
+    budget = sketch_budget.SketchBudget(board, output_type, encoding, show.millis)
+    budget.configure(button=button != 'None')
+
+    problems = checkShow(show, button, budget)
+    if problems:
+        return None, problems
+
+    base_name = os.path.splitext(os.path.basename(file_name))[0] + '.ino'
+    sketch_file = os.path.join(out_dir or os.path.dirname(file_name), base_name)
+
+    template_dict = sketch_output.templateDict(
+        [routine.name for routine in show.routines],
+        [int(routine.pin) for routine in show.routines],
+        [routine.ys for routine in show.routines],
+        button if button == 'None' else int(button),
+        output_type, encoding, show.millis)
+    sketch_output.writeSketch(sketch_file, output_type, template_dict)
+
+    return sketch_file, []
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write Arduino sketches for saved .servo files')
+    parser.add_argument('files', nargs='+', metavar='FILE',
+        help='.servo files to export')
+    parser.add_argument('-o', '--out-dir',
+        help='folder for the sketches, next to each .servo file by default')
+    parser.add_argument('--output-type', choices=sorted(sketch_output.TEMPLATE_FILES),
+        help='servos on a PCA9685 (i2c) or Arduino pins, as saved by default')
+    parser.add_argument('--button',
+        help="pin # of the start button or 'None', as saved by default")
+    parser.add_argument('--encoding', choices=sketch_output.ENCODINGS,
+        help='how routines are stored on the Arduino, as saved by default')
+    parser.add_argument('--board', default='Uno', choices=sorted(sketch_budget.BOARDS),
+        help='board the routines have to fit on (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+        help='files exported at once (default: %(default)s)')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    options = dict(out_dir=args.out_dir, output_type=args.output_type,
+                   button=args.button, encoding=args.encoding, board=args.board)
+    failed = 0
+
+    def report(file_name, sketch_file, problems):
+        if problems:
+            print('{}: {}'.format(file_name, '; '.join(problems)), file=sys.stderr)
+        else:
+            print('{} -> {}'.format(file_name, sketch_file))
+
+    # Templates are parsed once, worker processes load the cached bytecode
+    sketch_output.precompileTemplates()
+    error = sketch_output.cacheError()
+    if error:
+        print('Sketch templates cannot be cached: {}'.format(error), file=sys.stderr)
+
+    jobs = max(min(args.jobs or 1, len(args.files)), 1)
+    if jobs == 1:
+        # Not worth starting other processes
+        for file_name in args.files:
+            sketch_file, problems = exportFile(file_name, **options)
+            report(file_name, sketch_file, problems)
+            failed += bool(problems)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=sketch_output.precompileTemplates) as pool:
+            futures = {pool.submit(exportFile, file_name, **options): file_name
+                       for file_name in args.files}
+            for future in as_completed(futures):
+                sketch_file, problems = future.result()
+                report(futures[future], sketch_file, problems)
+                failed += bool(problems)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
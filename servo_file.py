@@ -0,0 +1,162 @@
+
+import json
+import mmap
+import struct
+
+import numpy as np
+
+import routine_model
+
+
+# A .servo file is:
+#   magic, version (uint16 LE), header length (uint32 LE)
+#   header, UTF-8 JSON with the show options and one entry per servo
+#   keyframes of every servo, one uint8 block after another
+# Each servo entry gives where its block starts after the header and
+# how long it is, so one servo can be read without the others
+MAGIC = b'SRVO'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+
+
+def save(file_name, show, extra=None):
+    '''
+    Write a routine_model.Show to file_name, extra adds keys to the
+    header that readHeader() gives back
+    '''
+
+    header = makeHeader(show)
+    header.update(extra or {})
+    header = json.dumps(header).encode('utf-8')
+
+    with open(file_name, 'wb') as writer:
+        writer.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        writer.write(header)
+        for routine in show.routines:
+            writer.write(routine.ys.tobytes())
+
+
+def isLegacy(file_name):
+    '''True for files pickled with dill by older versions'''
+
+    with open(file_name, 'rb') as reader:
+        magic = reader.read(len(MAGIC))
+
+    # Shorter files are neither, parseHeader() turns them down
+    return len(magic) == len(MAGIC) and magic != MAGIC
+
+
+def parseHeader(data, file_name, magic=MAGIC):
+    '''
+    Header dictionary and where the data after it starts, from the
+    file's first bytes. magic tells apart other files laid out the same
+    '''
+
+    if len(data) < PREAMBLE.size:
+        raise ValueError('{} is not a servo file'.format(file_name))
+
+    file_magic, version, header_size = PREAMBLE.unpack_from(data)
+    if file_magic != magic:
+        raise ValueError('{} is not a servo file'.format(file_name))
+    if version > VERSION:
+        raise ValueError('{} was saved by a newer version (format {})'.format(
+            file_name, version))
+
+    start = PREAMBLE.size + header_size
+    if len(data) < start:
+        raise ValueError('{} is cut short'.format(file_name))
+
+    header = json.loads(bytes(data[PREAMBLE.size:start]).decode('utf-8'))
+
+    return header, start
+
+
+def readHeader(file_name):
+    '''
+    Show options and servo entries without reading any keyframes,
+    legacy files have to be loaded whole
+    '''
+
+    if isLegacy(file_name):
+        return makeHeader(loadLegacy(file_name))
+
+    with open(file_name, 'rb') as reader:
+        data = reader.read(PREAMBLE.size)
+        if len(data) == PREAMBLE.size:
+            data += reader.read(PREAMBLE.unpack(data)[2])
+
+    return parseHeader(data, file_name)[0]
+
+
+def openChannels(file_name):
+    '''
+    Header and a read-only uint8 array of every servo's keyframes,
+    the arrays are views of the mapped file, nothing is copied
+    '''
+
+    with open(file_name, 'rb') as reader:
+        mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+    header, start = parseHeader(mapped, file_name)
+
+    channels = []
+    for servo in header['servos']:
+        if start + servo['offset'] + servo['length'] > len(mapped):
+            raise ValueError('{} is cut short'.format(file_name))
+        # The map stays open for as long as an array uses it
+        channels.append(np.frombuffer(mapped, dtype=np.uint8,
+            count=servo['length'], offset=start+servo['offset']))
+
+    return header, channels
+
+
+def load(file_name):
+    '''routine_model.Show from a .servo file, old dill files included'''
+
+    if isLegacy(file_name):
+        return loadLegacy(file_name)
+
+    header, channels = openChannels(file_name)
+
+    routines = [routine_model.Routine(servo['name'], values, servo['pin'],
+                                      servo['lower_limit'], servo['upper_limit'])
+                for servo, values in zip(header['servos'], channels)]
+
+    return routine_model.Show(routines, header['button_#'],
+        header['output_type'], header['encoding'],
+        header.get('millis', routine_model.Show().millis))
+
+
+def loadLegacy(file_name):
+    '''Show from a file pickled with dill, only imported when needed'''
+
+    import dill
+
+    with open(file_name, 'rb') as reader:
+        return routine_model.Show.fromSettings(dill.load(reader))
+
+
+def makeHeader(show):
+    '''The header save() would write for show'''
+
+    servos = []
+    offset = 0
+    for routine in show.routines:
+        servos.append({
+            'name': routine.name,
+            'pin': routine.pin,
+            'lower_limit': routine.lower_limit,
+            'upper_limit': routine.upper_limit,
+            'offset': offset,
+            'length': len(routine)
+        })
+        offset += len(routine)
+
+    return {
+        'seconds': show.seconds,
+        'button_#': show.button,
+        'output_type': show.output_type,
+        'encoding': show.encoding,
+        'millis': show.millis,
+        'servos': servos
+    }
@@ -1,18 +1,14 @@
 
-import dill
-import jinja2
+import io
 import os
 import serial
 import traceback
 
-from matplotlib import use as Use
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from matplotlib.pyplot import pause
+import numpy as np
 
 from PIL import Image, ImageTk
 
-from time import sleep
+from time import monotonic, sleep
 
 import tkinter as tk
 import tkinter.ttk as ttk
@@ -22,14 +18,21 @@ from tkinter import messagebox
 from servo_popups import *
 from settings_popup import *
 
-
-# Needed to embed matplotlib in tkinter
-Use('TkAgg')
+import perf_timing
+import plot_overview
+import routine_model
+import sample_resampler
+import serial_reader
+import servo_file
+import sketch_budget
+import sketch_output
 
 
 class MainApp():
     def __init__(self, width=800, height=600):
         
+        # matplotlib is imported when recording makes the first plot,
+        # so the window comes up without waiting for it
         self.main = tk.Tk()
         self.main.title('Servo Input Recorder')
         self.main.geometry('{}x{}'.format(width, height))
@@ -54,6 +57,8 @@ class MainApp():
         
         self.about_menu = tk.Menu(self.main, tearoff=0)
         self.about_menu.add_command(label='About', command=lambda: AboutPopup())
+        self.about_menu.add_separator()
+        self.profiler_menu = ProfilerMenu(self.about_menu, 'Servo Input Recorder')
         
         menubar.add_cascade(label='File', menu=self.file_menu)
         menubar.add_cascade(label='Help', menu=self.about_menu)
@@ -88,14 +93,30 @@ class SettingsPage(ttk.Frame):
     record_state = False
     prev_record = False
     
-    max_seconds = 360
     max_servos = 8
     
+    port_name = '/dev/ttyUSB0'
+    baud_rate = 115200 # Must match Serial.begin() in the Arduino sketch
+    sample_ms = 20     # Must match delay_time in the Arduino sketch
+    frame_ms = 50      # GUI drains recorded samples at 20 Hz
+    
     def __init__(self, parent_notebook, parent):
         super().__init__()
         
         self.parent_notebook = parent_notebook
         self.parent = parent
+        
+        # Flash/SRAM the sketch will need, replaces a fixed max seconds
+        self.budget = sketch_budget.SketchBudget()
+        
+        # Routines of every servo, filled in while recording
+        self.show = routine_model.Show(millis=SettingsPage.millis)
+        
+        # Serial port and the thread reading it while recording
+        self.arduino = None
+        self.reader = None
+        self.resampler = None
+        self.drain_job = None
 
         self.buildPage()
         
@@ -107,16 +128,22 @@ class SettingsPage(ttk.Frame):
         self.button_entry_val = tk.StringVar()
         self.btn_check_var = tk.IntVar()
         self.output_type_var = tk.StringVar()   # Pin nums or i2c
+        self.encoding_var = tk.StringVar()      # Full, compressed or keyframes
+        self.board_var = tk.StringVar()         # Board the sketch must fit on
+        self.board_var.set('Uno')
         
         # Used to update the labels when max seconds/servos changed
         self.seconds_label_var = tk.StringVar()
         self.servo_label_var = tk.StringVar()
+        self.budget_label_var = tk.StringVar()
         
         self.main_frame = ttk.Frame(self)
         self.main_frame.pack(expand=1, fill=tk.BOTH)
         
         # Use Shift+d to change max seconds/servos
         self.main_frame.bind("<Shift-D>", lambda event: DevPopup(self))
+        # Shift+t shows how long redraws take, for tracking down stutter
+        self.main_frame.bind("<Shift-T>", lambda event: TimingPopup())
         self.main_frame.bind("<Button-1>", lambda event: self.main_frame.focus_set())
         
         # --- Left side Frame ---
@@ -126,8 +153,6 @@ class SettingsPage(ttk.Frame):
         l_title = ttk.Label(left, text='Settings', font=(None, 25))
         l_title.grid(columnspan=5, pady=20)
                 
-        self.seconds_label_var.set('Routine length (in seconds)\
-            \n(1-{}):'.format(SettingsPage.max_seconds))
         seconds_label = ttk.Label(left, textvariable=self.seconds_label_var)
         seconds_label.grid(padx=10, pady=15)
         
@@ -172,12 +197,42 @@ class SettingsPage(ttk.Frame):
         output_choice.grid(pady=15, sticky=tk.W)
         
         self.i2c = ttk.Radiobutton(output_choice, text='i2c PCA9865',
-            variable=self.output_type_var, value='i2c')
+            variable=self.output_type_var, value='i2c',
+            command=self.updateBudget)
         self.i2c.pack(side=tk.LEFT, padx=5)
         self.i2c.invoke()   # Sets as efault selection
         self.pins = ttk.Radiobutton(output_choice, text='Arduino Pins',
-            variable=self.output_type_var, value='pins')
+            variable=self.output_type_var, value='pins',
+            command=self.updateBudget)
         self.pins.pack(side=tk.RIGHT, padx=5)
+        
+        encoding_choice = ttk.LabelFrame(right, text='Routine Data')
+        encoding_choice.grid(pady=15, padx=5, row=2, column=1, sticky=tk.W)
+        
+        self.full = ttk.Radiobutton(encoding_choice, text='Full',
+            variable=self.encoding_var, value='full',
+            command=self.updateBudget)
+        self.full.pack(side=tk.LEFT, padx=5)
+        self.full.invoke()   # Sets as default selection
+        self.compressed = ttk.Radiobutton(encoding_choice, text='Compressed',
+            variable=self.encoding_var, value='compressed',
+            command=self.updateBudget)
+        self.compressed.pack(side=tk.LEFT, padx=5)
+        self.keyframes = ttk.Radiobutton(encoding_choice, text='Keyframes',
+            variable=self.encoding_var, value='keyframes',
+            command=self.updateBudget)
+        self.keyframes.pack(side=tk.RIGHT, padx=5)
+        
+        board_frame = ttk.LabelFrame(right, text='Board')
+        board_frame.grid(pady=15, sticky=tk.W, columnspan=2)
+        
+        board_choice = ttk.Combobox(board_frame, textvariable=self.board_var,
+            values=list(sketch_budget.BOARDS), state='readonly', width=12)
+        board_choice.bind('<<ComboboxSelected>>', self.updateBudget)
+        board_choice.pack(side=tk.LEFT, padx=5)
+        budget_label = ttk.Label(board_frame,
+            textvariable=self.budget_label_var)
+        budget_label.pack(side=tk.RIGHT, padx=5)
     
         self.output_button = ttk.Button(right, text='Output Sketch', width=15,
             state='disabled', command=self.outputSketch)
@@ -189,7 +244,7 @@ class SettingsPage(ttk.Frame):
 
         self.load_button = ttk.Button(right, text='Load',
             command=self.loadData, state='disabled')
-        self.load_button.grid(row=4, column=1)
+        self.load_button.grid(row=5, column=1)
 
         # Images for the record button
         record_image = Image.open('resources/record.png')
@@ -204,7 +259,12 @@ class SettingsPage(ttk.Frame):
             command=self.toggleRecording, 
             compound=tk.BOTTOM,
             image=self.record_image)
-        self.record_button.grid(row=5, columnspan=3, pady=50)
+        self.record_button.grid(row=6, columnspan=3, pady=50)
+        
+        # Plots on hidden tabs are only redrawn once they are shown
+        self.parent_notebook.bind('<<NotebookTabChanged>>', self.refreshPlots)
+        
+        self.updateBudget()
     
     def toggleBtnCheckbox(self):
         '''Toggle state of button entry based on checkbox'''
@@ -214,8 +274,29 @@ class SettingsPage(ttk.Frame):
         else:
             self.button_entry.configure(state='disabled')
             self.button_entry_val.set('None')
+        
+        self.updateBudget()
+    
+    def updateBudget(self, event=None):
+        '''Update memory use for the chosen board and output settings'''
+        
+        # Radiobutton variables are empty until their default is invoked
+        self.budget.configure(board=self.board_var.get(),
+            output_type=self.output_type_var.get() or None,
+            encoding=self.encoding_var.get() or None,
+            button=bool(self.btn_check_var.get()))
+        
+        # Recording only needs the length, routines are not known yet
+        num_servos = max(len(SettingsPage.plot_pages), 1)
+        self.max_nodes = (self.budget.maxSeconds(num_servos)*2) + 1
+        
+        self.seconds_label_var.set('Routine length (in seconds)\
+            \n(1-{}):'.format(self.budget.maxSeconds(num_servos)))
+        self.budget_label_var.set(self.budget.summary())
     
-    def toggleRecording(self):
+    def toggleRecording(self, reason=None):
+        '''Start or stop recording, reason is why it stopped if not the user'''
+        
         if self.record_state == True:
             self.record_state = False
             self.record_button['image'] = self.record_image
@@ -233,6 +314,8 @@ class SettingsPage(ttk.Frame):
         
         if self.record_state:
             self.talkToArduino()    
+        else:
+            self.stopArduino(reason)
     
     def initializeArduino(self):
         '''Initialize required number of tabs/plots'''
@@ -240,7 +323,11 @@ class SettingsPage(ttk.Frame):
         self.arduino.write(b'n') # Command arduino to send servo count 
         
         #####
-        values = self.arduino.readline()
+        # Port has a short timeout so the reader thread can stop quickly
+        values = b''
+        give_up = monotonic() + 5
+        while not values.strip() and monotonic() < give_up:
+            values = self.arduino.readline()
         values = values.strip()
         # Breakdown line of data into individual values
         new_tabs = values.decode().strip(',').split(',')
@@ -254,6 +341,10 @@ class SettingsPage(ttk.Frame):
         
         self.num_of_servos.set(num_servos)
         self.generatePlots(new_tabs)
+        self.updateBudget()
+        # Room for the longest recording the board can hold
+        for page in SettingsPage.plot_pages:
+            page.routine.reserve(self.max_nodes)
         self.prev_record = True
         
         self.main_frame.unbind("<Shift-D>")
@@ -264,47 +355,43 @@ class SettingsPage(ttk.Frame):
         self.parent.main.update()
         
     def talkToArduino(self):
-        '''Open serial line with Arduino and read values.
+        '''Open serial line with Arduino and start reading values.
            Arduino sketch expects 'r' to start sending values
-           and 's' to stop sending values'''
+           and 's' to stop sending values, values arrive as binary
+           frames, see serial_reader.py'''
         try:
-            with serial.Serial('/dev/ttyUSB0', 9600) as self.arduino:
-                print('Waiting for Arduino')
-                sleep(2)   # Wait for arduino to be ready
-                
-                if not self.prev_record:
-                    self.initializeArduino()
-                
-                # Disable buttons while recording    
-                self.toggleButtonStates()
-    
-                # Send record signal
-                self.arduino.write(b'r')            
-                while self.record_state:
-                    if self.arduino.inWaiting() > 0:
-                        
-                        values = self.arduino.readline()
-                        values = values.strip()
-                        # Breakdown line of data into individual values
-                        new_ys = values.decode().strip(',').split(',')
-                        
-                        self.updatePlotData(new_ys)
-                        
-                        # Let tkinter do what it needs while stuck in this loop
-                        self.parent.main.update_idletasks()
-                        self.parent.main.update()
-                
-                # Command arduino to stop sending values        
+            self.arduino = serial.Serial(SettingsPage.port_name,
+                SettingsPage.baud_rate, timeout=0.1)
+            print('Waiting for Arduino')
+            sleep(2)   # Wait for arduino to be ready
+            
+            if not self.prev_record:
+                self.initializeArduino()
+                # Too many servos stops recording
                 if not self.record_state:
-                    self.arduino.write(b's')
-                
-                # Re-enable buttons
-                self.toggleButtonStates()
+                    return
+            
+            # Disable buttons while recording    
+            self.toggleButtonStates()
+            
+            # Frames are read on their own thread, GUI drains them at frame_ms
+            self.reader = serial_reader.SerialReader(self.arduino)
+            self.reader.start()
+            # Frames are placed on the half second keyframe grid by the
+            # time they arrived, not by counting them
+            self.resampler = sample_resampler.Resampler(
+                len(SettingsPage.plot_pages),
+                frame_period=SettingsPage.sample_ms/1000)
+            
+            # Send record signal
+            self.arduino.write(b'r')
+            self.drain_job = self.after(SettingsPage.frame_ms, self.drainSamples)
                 
         except serial.SerialException as e:
             self.record_state = False
             self.record_button['image'] = self.record_image
             self.record_button['text'] = 'Record'
+            self.closeArduino()
             
             print(e)
             messagebox.showerror('Error', 'Cannot find Arduino')
@@ -313,28 +400,127 @@ class SettingsPage(ttk.Frame):
             print('Something went wrong')
             print(e)
             print(traceback.format_exc())
- 
-    def updatePlotData(self, newYs):
-        # Update all plots
-        for index, data_point in enumerate(newYs):
-            plot = SettingsPage.plot_pages[index].plot
+    
+    def drainSamples(self):
+        '''Add every sample read since the last frame to the plots'''
+        
+        self.drain_job = None
+        
+        self.updatePlotData(self.resampler.feed(self.reader.drain()))
+        # Memory full stops recording part way through
+        if not self.record_state:
+            return
+        
+        if self.reader.error:
+            print(self.reader.error)
+            self.toggleRecording('Lost connection to Arduino')
+            return
+        
+        self.drain_job = self.after(SettingsPage.frame_ms, self.drainSamples)
+    
+    def stopArduino(self, reason=None):
+        '''
+        Tell the Arduino to stop sending values, add the last of them
+        and close the port, then report how the recording went.
+        reason is why recording stopped, if it was not the user
+        '''
+        
+        if self.drain_job is not None:
+            self.after_cancel(self.drain_job)
+            self.drain_job = None
+        
+        if self.arduino is not None:
+            try:
+                # Command arduino to stop sending values        
+                self.arduino.write(b's')
+            except serial.SerialException as e:
+                print(e)
+        
+        report = None
+        if self.reader is not None:
+            self.reader.stop()
+            # Frames read since the last drain are part of the recording too
+            if self.updatePlotData(self.resampler.feed(self.reader.drain())):
+                reason = reason or self.memoryFullText()
             
-            if (len(self.plot_pages) * ((len(plot.ys)-1)/2)) >= SettingsPage.max_seconds:
-                self.toggleRecording()
-                self.record_button['state'] = 'disabled'
-                messagebox.showinfo('Memory Full',
-                    'Total recording time limited to {} seconds'.format(SettingsPage.max_seconds))
-                break
+            report = self.resampler.report()
+            if self.reader.dropped:
+                report += '\nDropped {} samples'.format(self.reader.dropped)
+            self.reader = None
+            self.resampler = None
+        
+        if self.arduino is not None:
+            self.closeArduino()
             
-            plot.ys.append(int(data_point))
-            plot.xs =[i for i in range(len(plot.ys))]
+            # Re-enable buttons
+            self.toggleButtonStates()
+        
+        # One dialog, once the port is closed
+        if reason:
+            report = reason if report is None else reason + '\n\n' + report
+            print(report)
+            messagebox.showwarning('Recording Stopped', report)
+        elif report:
+            print(report)
+            messagebox.showinfo('Recording', report)
+    
+    def closeArduino(self):
+        if self.arduino is not None:
+            self.arduino.close()
+            self.arduino = None
+ 
+    @perf_timing.timed('plot.data')
+    def updatePlotData(self, batch):
+        '''
+        Append a batch of keyframes to all plots, then redraw once.
+        batch has one row per keyframe and one column per servo.
+        Returns True once the board's memory is full
+        '''
+        
+        if not len(batch):
+            return False
+        
+        room = self.max_nodes - len(SettingsPage.plot_pages[0].routine)
+        full = len(batch) >= room
+        batch = batch[:max(room, 0)]
+        
+        for index, page in enumerate(SettingsPage.plot_pages):
+            page.routine.append(batch[:, index])
+        
+        self.num_of_seconds.set(page.routine.seconds)
+        self.refreshPlots()
+        
+        if full:
+            self.record_button['state'] = 'disabled'
+            # Already stopping when the last frames fill it
+            if self.record_state:
+                self.toggleRecording(self.memoryFullText())
+        
+        return full
+    
+    def memoryFullText(self):
+        return 'Memory Full\nRecording time on {} limited to {} seconds'.format(
+            self.budget.board.name, (self.max_nodes-1) // 2)
+    
+    def refreshPlots(self, event=None):
+        '''
+        Redraw the plot on the visible tab if it has new values,
+        hidden plots stay dirty until their tab is selected
+        '''
+        
+        current = self.parent_notebook.select()
+        
+        for page in SettingsPage.plot_pages:
+            plot = page.plot
+            if str(page) != current or not plot.dirty:
+                continue
             
-            #~ plot.length = len(plot.ys) + 1
-            plot.parent.slider['to'] = (len(plot.ys) / 2) - 10
+            # Follow the end of the recording while it grows
+            page.slider['to'] = (len(plot.ys) / 2) - 10
             plot.scale.set(len(plot.ys))
-            self.num_of_seconds.set(int((len(plot.ys)-1)/2))
-            
-            plot.update()
+            # Setting the scale may already have redrawn it
+            if plot.dirty:
+                plot.updatePos()
  
     def toggleButtonStates(self):
         if self.record_state:
@@ -358,6 +544,7 @@ class SettingsPage(ttk.Frame):
             self.parent_notebook.add(getattr(self, tab_name), text=tab_title)
             SettingsPage.plot_pages.append(getattr(self, tab_name))
             
+    @perf_timing.timed('sketch.output')
     def outputSketch(self):
         '''
         Output all data into a usable Arduino sketch
@@ -384,33 +571,19 @@ class SettingsPage(ttk.Frame):
             messagebox.showerror('Error', 'Check servo pin numbers')
             return
         
-        # Temporary data needed for template output
-        name_arr = [tab.name for tab in SettingsPage.plot_pages]
-        tweener_arrays = [
-            self.prettyOutput(self.inBetweeners(tab.plot.ys)) for tab in SettingsPage.plot_pages]
-        pin_names = ['{}_PIN'.format(tab.name) for tab in SettingsPage.plot_pages]
-        
-        # Keys for template
-        template_dict = {
-            'list_of_names' : name_arr,
-            'interval' : SettingsPage.millis,
-            'tweenerArrays': tweener_arrays,
-            'button' : pin,
-            'pinNames' : pin_names,
-            'pinNums' : pin_nums,
-            'outputType' : self.output_type_var.get()}
-        
-        # Stuff for jinja2 template
-        template_loader = jinja2.FileSystemLoader(
-            searchpath=os.path.join(os.path.dirname(__file__)))
-        template_env = jinja2.Environment(loader=template_loader)
-        template_env.globals.update(zip=zip)
-        if self.output_type_var.get() == 'i2c':
-            template_index = template_env.get_template('i2c_template.txt')
-        elif self.output_type_var.get() == 'pins':
-            template_index = template_env.get_template('pin_template.txt')
-        else:
-            raise Exception
+        # Verify the recorded routines fit on the chosen board
+        self.updateBudget()
+        problems = self.budget.check(routines=
+            [tab.routine.ys for tab in SettingsPage.plot_pages])
+        if problems:
+            messagebox.showerror('Memory Error', '\n'.join(problems))
+            return
+        
+        template_dict = sketch_output.templateDict(
+            [tab.name for tab in SettingsPage.plot_pages], pin_nums,
+            [tab.routine.ys for tab in SettingsPage.plot_pages], pin,
+            self.output_type_var.get(), self.encoding_var.get(),
+            SettingsPage.millis)
         
         file_name = fd.asksaveasfilename(
             initialdir=os.path.join(os.path.dirname(__file__)),
@@ -419,8 +592,15 @@ class SettingsPage(ttk.Frame):
             confirmoverwrite=True)
     
         if file_name:   # Prevents error if 'cancel' is pushed
-            with open(file_name, 'w') as outFile:
-                outFile.write(template_index.render(template_dict))
+            # Rendered straight into the file with the cached template
+            sketch_output.writeSketch(file_name, self.output_type_var.get(),
+                template_dict)
+            
+            error = sketch_output.cacheError()
+            if error:
+                print(error)
+                messagebox.showwarning('Warning', 'Sketch templates cannot '
+                    'be cached, every session parses them again\n\n{}'.format(error))
     
     @classmethod
     def inBetweeners(cls, arr):
@@ -429,37 +609,17 @@ class SettingsPage(ttk.Frame):
         for smooth servo movement 
         '''
         
-        temp_arr = []
-        divisor = int(500/cls.millis)
-        
-        for index, value in enumerate(arr):
-            try:
-                step = (arr[index+1] - value) / divisor
-                for i in range(divisor):
-                    temp_arr.append(round(value + (step*i)))
-            except IndexError:
-                temp_arr.append(value)
-        
-        return temp_arr
+        return sketch_output.inBetweeners(arr, cls.millis)[0].tolist()
     
     def saveData(self):
         '''Save relevent info to file for later use'''
     
         try:
-            info_dict = {
-                         'seconds' : self.num_of_seconds.get(),
-                         'plot_pages' : [],
-                         'button_#' : self.button_entry_val.get(),
-                         'output_type': self.output_type_var.get()
-                        }
-        
+            self.show.button = self.button_entry_val.get()
+            self.show.output_type = self.output_type_var.get()
+            self.show.encoding = self.encoding_var.get()
             for page in self.plot_pages:
-                temp = []
-                temp.append(page.name)
-                temp.append(page.pin_num.get())
-                temp.append(page.plot.ys)
-            
-                info_dict['plot_pages'].append(temp)
+                page.routine.pin = page.pin_num.get()
             
             file_name = fd.asksaveasfilename(
                 initialdir=os.path.join(os.path.dirname(__file__)),
@@ -468,8 +628,7 @@ class SettingsPage(ttk.Frame):
                 confirmoverwrite=True)
             
             if file_name:   # Prevents error if dialog canceled
-                with open(file_name, 'wb') as writer:
-                    dill.dump(info_dict, writer)
+                servo_file.save(file_name, self.show)
             
         except Exception as e:
             print('Error saving...')
@@ -484,10 +643,16 @@ class SettingsPage(ttk.Frame):
                 title='Load Settings')
             
         if file_name:
-            self.load_flag = True
+            try:
+                # Files saved with dill by older versions load as well
+                self.settings = servo_file.load(file_name).toSettings()
+            except Exception as e:
+                print(e)
+                messagebox.showerror('Error', 'Cannot load {}'.format(
+                    os.path.basename(file_name)))
+                return
             
-            with open(file_name, 'rb') as reader:
-                self.settings = dill.load(reader)
+            self.load_flag = True
             
             self.generatePlots()
             
@@ -497,13 +662,9 @@ class SettingsPage(ttk.Frame):
     def prettyOutput(arr):
         '''Outputs the plot values array in more human readable form'''
     
-        tmp_str = ''
-        for index, num in enumerate(arr):
-            if (index+1) % 10 != 0:
-                tmp_str += '{}, '.format(num).rjust(5)
-            else:
-                tmp_str += '{},\n'.format(num).rjust(5)
-        return tmp_str 
+        buffer = io.StringIO()
+        sketch_output.writePretty(arr, buffer)
+        return buffer.getvalue()
 
     
 class PlotPage(ttk.Frame):
@@ -518,10 +679,22 @@ class PlotPage(ttk.Frame):
         
         self.plot_num = PlotPage.total_pages
         self.parent = parent
-        self.name = name    # Child plot uses this for title
+        
+        # Empty until values are recorded
+        self.routine = routine_model.Routine(name)
+        self.parent.show.add(self.routine)
 
         self.buildPage()
     
+    @property
+    def name(self):
+        '''Child plot uses this for title'''
+        return self.routine.name
+    
+    @name.setter
+    def name(self, name):
+        self.routine.name = name
+    
     def buildPage(self):
         '''Layout widgets for the tab'''
         
@@ -533,9 +706,15 @@ class PlotPage(ttk.Frame):
             to=self.parent.num_of_seconds.get()-10,
             length=self.parent.parent_notebook.winfo_width())
         
+        # Only imported once recording makes a plot
+        from matplotlib import use as Use
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        # Needed to embed matplotlib in tkinter
+        Use('TkAgg')
+        
         # Plot instance, bound to tab instance
-        self.plot = Plot(self, self.parent.num_of_seconds.get(), self.slider,
-            self.plot_num)
+        self.plot = Plot(self, self.routine, self.slider, self.plot_num)
         
         # Drawing area for the graph
         canvas = FigureCanvasTkAgg(self.plot.fig, master=self)
@@ -543,6 +722,7 @@ class PlotPage(ttk.Frame):
         canvas.mpl_connect('pick_event', self.plot.onPress)
         canvas.mpl_connect('button_release_event', self.plot.onRelease)
         canvas.mpl_connect('motion_notify_event', self.plot.onMotion)
+        canvas.mpl_connect('button_press_event', self.plot.overview.onClick)
         
         pin_assign_frame = ttk.Frame(self, padding=10)
         pin_label = ttk.Label(pin_assign_frame, text='Pin # or address: ')
@@ -586,58 +766,126 @@ class Plot():
     animating the interactive plot, is a child of a PlotPage object
     '''
     
-    def __init__(self, parent, seconds, scale, num):
+    def __init__(self, parent, routine, scale, num):
+        from matplotlib.figure import Figure
+        
         self.parent = parent
         self.scale = scale
         self.scale['command'] = self.updatePos
         
         self.scale_pos = 0
         self.num = num                 # Which number servo, for plot title
-        self.length = 0
         
         self.click = False             # Node follows mouse only when clicked
         self.point_index = None        # Track which node has been selected
         
         # For keeping values within range of servo degrees
-        self.upper_limit = 179
-        self.lower_limit = 0
         self.limit_range = lambda n: max(min(self.upper_limit, n), self.lower_limit)
         
         # Initial Graph -----
         self.fig = Figure(figsize=(10,5), dpi=100)
-        self.fig.subplots_adjust(bottom=0.18)
+        self.fig.subplots_adjust(bottom=0.27)
         self.ax = self.fig.add_subplot(111)
         
-        self.xs = [i for i in range(self.length)]
-        self.ys = [self.lower_limit for i in self.xs]
+        # Whole recording in a strip under the plot
+        self.overview = plot_overview.Overview(self.fig, self.ax, self.jumpTo)
+        self.changed = None            # Nodes the overview has not seen
+        
+        # Recorded values go into the routine, the plot redraws when it changes
+        self.routine = routine
+        self.routine.observe(self.onRoutineChanged)
+        self.dirty = False             # New values not yet drawn
+        
+        # Nodes on the line and nodes artists, see drawPlot()
+        self.window_start = 0
+        self.window_end = 0
         
         self.setPlot()
         self.drawPlot()
        
+    @property
+    def ys(self):
+        return self.routine.ys
+    
+    @property
+    def length(self):
+        return len(self.routine)
+    
+    @property
+    def upper_limit(self):
+        return self.routine.upper_limit
+    
+    @property
+    def lower_limit(self):
+        return self.routine.lower_limit
+    
+    def onRoutineChanged(self, routine, start, old, new):
+        '''Values were recorded or edited, drawn on the next update'''
+        
+        if len(old) == len(new):
+            self.nodesChanged(start, start+len(new))
+        else:
+            self.nodesChanged(start, len(routine))
+        self.dirty = True
+    
+    def nodesChanged(self, start=0, end=None):
+        '''
+        Nodes start to end have new values, the whole recording if end
+        is None. The overview redoes them on the next update
+        '''
+        
+        if end is None or self.changed == (0, None):
+            self.changed = (0, None)
+        elif self.changed is None:
+            self.changed = (start, end)
+        else:
+            self.changed = (min(start, self.changed[0]), max(end, self.changed[1]))
+    
     def updatePos(self, *args):
         '''Read the scale to move plot viewing area,
            args are a tuple of scale value automatically passed in'''
         self.scale_pos = self.scale.get()
         self.update()
     
+    def jumpTo(self, node):
+        '''Centre the plot on a node clicked in the overview'''
+        
+        seconds = max(min(node/2 - 5, self.scale['to']), 0)
+        self.scale.set(seconds)
+        # Setting the scale may already have moved the plot
+        if self.scale_pos != self.scale.get():
+            self.updatePos()
+    
     def setPlot(self):
         '''Elements of the plot which do not need to be redrawn every update '''
         
+        from matplotlib.ticker import FuncFormatter, MultipleLocator
+        
         self.ax.set_ylim([-10,190])
         self.ax.set_yticks(range(0,190,20))
         
+        # A tick on every node, labelled in seconds
+        self.ax.xaxis.set_major_locator(MultipleLocator(1))
+        self.ax.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: str(x/2)))
+        self.ax.tick_params(axis='x', labelrotation=45)
+        
         self.ax.grid(alpha=.5)
         self.ax.set_xlabel('Seconds')
         self.ax.set_ylabel('Degree of Motion', fontname='BPG Courier GPL&GNU',
             fontsize=14)
         
-    def clearPlotLines(self):
-        '''Remove plotted lines so they can be redrawn'''
+        # Artists are made once, drawPlot() only changes their data
+        # Plot upper and lower limits
+        self.upper = self.ax.axhline(self.upper_limit, color='k',
+            linestyle='--', alpha=.6, linewidth=1)
+        self.lower = self.ax.axhline(self.lower_limit, color='k',
+            linestyle='--', alpha=.6, linewidth=1)
+        
+        # Line
+        self.line, = self.ax.plot([], [], color='orange', markersize=10)
         
-        self.line.remove()
-        self.nodes.remove()
-        self.upper.remove()
-        self.lower.remove()
+        # Clickable nodes
+        self.nodes, = self.ax.plot([], [], 'k.', markersize=10, picker=5.0)
        
     def drawPlot(self):
         '''Draw the actual plot'''
@@ -648,37 +896,30 @@ class Plot():
         pos = round(self.scale_pos*2)   # scale_pos is in seconds, pos is in ticks
         pos = max(pos, 0)               
         
-        # Confine y-values to within upper and lower limits
-        self.ys = [self.limit_range(node) for node in self.ys]
-        
         # Only 'x_window' of plot is viewable
         self.ax.set_xlim([pos-.5, pos+x_window+.5])
-        self.ax.set_xticks([i for i in range(pos, pos+x_window+1)])
-        self.ax.set_xticklabels([i/2 for i in self.ax.get_xticks()])
-        for tick in self.ax.get_xticklabels():
-            tick.set_rotation(45)
+        self.overview.showView(pos, pos+x_window)
         
-        #~ # Plot upper and lower limits
-        self.upper, = self.ax.plot(self.xs, [self.upper_limit for i in self.xs],
-            'k--', alpha=.6, linewidth=1)
-        self.lower, = self.ax.plot(self.xs, [self.lower_limit for i in self.xs],
-            'k--', alpha=.6, linewidth=1)
+        # Lines only hold the visible nodes, plus one each side so the
+        # line runs off the edges
+        self.window_start = max(pos-1, 0)
+        self.window_end = min(pos+x_window+2, self.length)
         
-        # Line
-        self.line, = self.ax.plot(self.xs, self.ys, color='orange',
-            markersize=10)
-            
-        # Clickable nodes
-        self.nodes, = self.ax.plot(self.xs, self.ys, 'k.', 
-            markersize=10, picker=5.0)
+        self.upper.set_ydata([self.upper_limit]*2)
+        self.lower.set_ydata([self.lower_limit]*2)
+        
+        xs = np.arange(self.window_start, self.window_end)
+        ys = self.ys[self.window_start:self.window_end]
+        self.line.set_data(xs, ys)
+        self.nodes.set_data(xs, ys)
         
     def onPress(self, event):
         '''Which node has been clicked'''
         
-        point = event.artist
         index = event.ind
         
-        self.point_index = int(index[0])
+        # Nodes artist only holds the visible part of the routine
+        self.point_index = int(index[0]) + self.window_start
         
         if not event.mouseevent.dblclick:
             self.click = True
@@ -688,12 +929,13 @@ class Plot():
             sleep(.1)  # Short delay to end all events on mainloop
             ValuePopup(self, self.point_index)
         
+    @perf_timing.timed('plot.motion')
     def onMotion(self, event):
-        if self.click and event.inaxes:
-            # Point follows mouse on y-axis
-            self.ys[self.point_index] = self.limit_range(event.ydata)
-            # Round to nearest whole degree
-            self.ys[self.point_index] = int(round(self.ys[self.point_index]))
+        if self.click and event.inaxes is self.ax:
+            # Point follows mouse on y-axis, rounded to nearest whole degree
+            # before it is stored as a byte
+            self.routine.set(self.point_index,
+                int(round(self.limit_range(event.ydata))))
             
             self.update()
     
@@ -702,13 +944,17 @@ class Plot():
             self.click = False
             self.point_index = None
     
+    @perf_timing.timed('plot.update')
     def update(self):
         '''Re-draw plot after moving a point'''
 
-        self.clearPlotLines()
+        if self.changed is not None:
+            self.overview.update(self.ys, *self.changed)
+            self.changed = None
         
         self.drawPlot()
         self.fig.canvas.draw()
+        self.dirty = False
         
 
 
@@ -1,15 +1,8 @@
 
-import dill
-import jinja2
+import io
 import os
 import traceback
 
-from matplotlib import use as Use
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from matplotlib.patches import Rectangle
-from matplotlib.widgets import SpanSelector
-
 from math import ceil
 from time import sleep
 
@@ -21,15 +14,23 @@ from tkinter import messagebox
 from servo_popups import *
 from settings_popup import *
 
-from pprint import pprint
-
-# Needed to embed matplotlib in tkinter
-Use('TkAgg')
+import edit_journal
+import perf_timing
+import plot_overview
+import routine_model
+import servo_file
+import show_library
+import sketch_budget
+import sketch_output
+import undo_stack
 
+from pprint import pprint
 
 class MainApp():
     def __init__(self, width=800, height=600):
         
+        # matplotlib is imported when the first plot is shown,
+        # so the window comes up without waiting for it
         self.main = tk.Tk()
         self.main.title('Servo Programmer')
         self.main.geometry('{}x{}'.format(width, height))
@@ -42,6 +43,7 @@ class MainApp():
         
         self.buildPage()
         
+        self.main.protocol("WM_DELETE_WINDOW", self.onClose)
         self.main.mainloop()
         
     def buildPage(self):
@@ -54,8 +56,10 @@ class MainApp():
             state='disabled')
         self.file_menu.add_command(label='Load',
             command=lambda: self.settings_tab.loadData())
+        self.file_menu.add_command(label='Library',
+            command=lambda: self.settings_tab.openLibrary())
         self.file_menu.add_command(label='Quit',
-            command=self.main.destroy)
+            command=self.onClose)
         
         self.edit_menu = tk.Menu(menubar, tearoff=0)
         self.edit_menu.add_command(label='Add Servo', 
@@ -67,9 +71,20 @@ class MainApp():
         self.edit_menu.add_command(label='Output Sketch',
             command=lambda: self.settings_tab.outputSketch(), 
             state='disabled')
+        self.edit_menu.add_separator()
+        self.edit_menu.add_command(label='Undo', accelerator='Ctrl+Z',
+            command=lambda: self.settings_tab.undo())
+        self.edit_menu.add_command(label='Redo', accelerator='Ctrl+Y',
+            command=lambda: self.settings_tab.redo())
+        
+        self.main.bind('<Control-z>', lambda event: self.settings_tab.undo())
+        self.main.bind('<Control-y>', lambda event: self.settings_tab.redo())
+        self.main.bind('<Control-Z>', lambda event: self.settings_tab.redo())
         
         self.about_menu = tk.Menu(self.main, tearoff=0)
         self.about_menu.add_command(label='About', command=lambda: AboutPopup())
+        self.about_menu.add_separator()
+        self.profiler_menu = ProfilerMenu(self.about_menu, 'Servo Programmer')
         
         menubar.add_cascade(label='File', menu=self.file_menu)
         menubar.add_cascade(label='Edit', menu=self.edit_menu)
@@ -87,6 +102,12 @@ class MainApp():
         notebook.add(self.settings_tab, text='Settings')
         
         notebook.pack(anchor=tk.CENTER, fill=tk.BOTH)
+    
+    def onClose(self):
+        '''Finish writing the autosave before closing app'''
+        
+        self.settings_tab.journal.close()
+        self.main.destroy()
         
 
 class SettingsPage(ttk.Frame):
@@ -98,18 +119,37 @@ class SettingsPage(ttk.Frame):
     initial_load_flag = False    # True after first time loading data
     load_flag = False
     
-    max_seconds = 360
     max_servos = 8
     node_default_val = 90
     
+    # Folder of saved shows the library lists
+    library_dir = os.path.dirname(os.path.abspath(__file__))
+    # Edits are journaled here until saved, see edit_journal.py
+    autosave_name = os.path.join(library_dir, '.autosave')
+    
     def __init__(self, parent_notebook, parent):
         super().__init__()
         
         self.parent_notebook = parent_notebook
         self.parent = parent
         
+        # Flash/SRAM the sketch will need, replaces a fixed max seconds
+        self.budget = sketch_budget.SketchBudget()
+        
+        # Routines of every servo, plot pages show and edit them
+        self.show = routine_model.Show(millis=SettingsPage.millis)
+        # Index of saved shows, read when the library is first opened
+        self.library = None
+        
+        self.journal = edit_journal.Journal(SettingsPage.autosave_name)
+        # Changes of keyframes only, so long sessions stay small
+        self.undo_stack = undo_stack.UndoStack()
+        
         self.buildPage()
         
+        # Recovered servos need the notebook to be finished first
+        self.after_idle(self.startJournal)
+        
     def buildPage(self):
         '''Layout widgets for the tab'''
         
@@ -118,10 +158,14 @@ class SettingsPage(ttk.Frame):
         self.button_entry_val = tk.StringVar()
         self.btn_check_var = tk.IntVar()
         self.output_type_var = tk.StringVar()   # Pin nums or i2c
+        self.encoding_var = tk.StringVar()      # Full, compressed or keyframes
+        self.board_var = tk.StringVar()         # Board the sketch must fit on
+        self.board_var.set('Uno')
         
         # Used to update the labels when max seconds/servos changed
         self.seconds_label_var = tk.StringVar()
         self.servo_label_var = tk.StringVar()
+        self.budget_label_var = tk.StringVar()
         
         main_frame = ttk.Frame(self)
         main_frame.pack(expand=1, fill=tk.BOTH)
@@ -129,6 +173,8 @@ class SettingsPage(ttk.Frame):
         # Use Shift+d to change max seconds/servos
         #~ main_frame.bind("<Shift-D>", lambda event: DevPopup(self))
         main_frame.bind("<Shift-D>", lambda event: self.changeDefaults())
+        # Shift+t shows how long redraws take, for tracking down stutter
+        main_frame.bind("<Shift-T>", lambda event: TimingPopup())
         main_frame.bind("<Button-1>", lambda event: main_frame.focus_set())
         
         # --- Left side Frame ---
@@ -138,8 +184,6 @@ class SettingsPage(ttk.Frame):
         l_title = ttk.Label(left, text='Settings', font=(None, 25))
         l_title.grid(columnspan=5, pady=20)
         
-        self.seconds_label_var.set('Routine length (in seconds)\
-            \n(1-{}):'.format(SettingsPage.max_seconds))
         seconds_label = ttk.Label(left, textvariable=self.seconds_label_var)
         seconds_label.grid(padx=10, pady=15)
         
@@ -183,19 +227,52 @@ class SettingsPage(ttk.Frame):
         output_choice.grid(pady=15, sticky=tk.W)
         
         self.i2c = ttk.Radiobutton(output_choice, text='i2c PCA9865',
-            variable=self.output_type_var, value='i2c')
+            variable=self.output_type_var, value='i2c',
+            command=self.updateBudget)
         self.i2c.pack(side=tk.LEFT, padx=5)
         self.i2c.invoke()   # Sets as efault selection
         self.pins = ttk.Radiobutton(output_choice, text='Arduino Pins',
-            variable=self.output_type_var, value='pins')
+            variable=self.output_type_var, value='pins',
+            command=self.updateBudget)
         self.pins.pack(side=tk.RIGHT, padx=5)
+        
+        encoding_choice = ttk.LabelFrame(right, text='Routine Data')
+        encoding_choice.grid(pady=15, padx=5, row=2, column=1, sticky=tk.W)
+        
+        self.full = ttk.Radiobutton(encoding_choice, text='Full',
+            variable=self.encoding_var, value='full',
+            command=self.updateBudget)
+        self.full.pack(side=tk.LEFT, padx=5)
+        self.full.invoke()   # Sets as default selection
+        self.compressed = ttk.Radiobutton(encoding_choice, text='Compressed',
+            variable=self.encoding_var, value='compressed',
+            command=self.updateBudget)
+        self.compressed.pack(side=tk.LEFT, padx=5)
+        self.keyframes = ttk.Radiobutton(encoding_choice, text='Keyframes',
+            variable=self.encoding_var, value='keyframes',
+            command=self.updateBudget)
+        self.keyframes.pack(side=tk.RIGHT, padx=5)
+        
+        board_frame = ttk.LabelFrame(right, text='Board')
+        board_frame.grid(pady=15, sticky=tk.W, columnspan=2)
+        
+        board_choice = ttk.Combobox(board_frame, textvariable=self.board_var,
+            values=list(sketch_budget.BOARDS), state='readonly', width=12)
+        board_choice.bind('<<ComboboxSelected>>', self.updateBudget)
+        board_choice.pack(side=tk.LEFT, padx=5)
+        budget_label = ttk.Label(board_frame,
+            textvariable=self.budget_label_var)
+        budget_label.pack(side=tk.RIGHT, padx=5)
     
         self.output_button = ttk.Button(right, text='Output Sketch', width=15,
             state='disabled', command=self.outputSketch)
         self.output_button.grid(pady=50, columnspan=2)
-    
+        
+        # Memory use is worked out again each time this tab is shown
+        self.parent_notebook.bind('<<NotebookTabChanged>>', self.onTabChanged)
 
         self.resetEntries()
+        self.updateBudget()
     
     def toggle_btn_checkbox(self):
         '''Toggle state of button entry based on checkbox'''
@@ -205,6 +282,36 @@ class SettingsPage(ttk.Frame):
         else:
             self.button_entry.configure(state='disabled')
             self.button_entry_val.set('None')
+        
+        self.updateBudget()
+    
+    def onTabChanged(self, event=None):
+        if self.parent_notebook.select() == str(self):
+            self.updateBudget()
+            return
+        
+        # Plots are only made and drawn once they are looked at
+        for page in SettingsPage.plot_pages:
+            if page.isShown():
+                page.showPlot()
+    
+    def updateBudget(self, event=None):
+        '''Update memory use for the chosen board and output settings'''
+        
+        # Radiobutton variables are empty until their default is invoked
+        self.budget.configure(board=self.board_var.get(),
+            output_type=self.output_type_var.get() or None,
+            encoding=self.encoding_var.get() or None,
+            button=bool(self.btn_check_var.get()))
+        
+        try:
+            num_servos = self.num_of_servos.get()
+        except tk.TclError:
+            num_servos = 1
+        
+        self.budget_label_var.set(self.budget.summary())
+        self.seconds_label_var.set('Routine length (in seconds)\
+            \n(1-{}):'.format(self.budget.maxSeconds(num_servos)))
     
     def resetEntries(self):
         '''Clear the entry widgets'''
@@ -218,32 +325,21 @@ class SettingsPage(ttk.Frame):
         
         cls = SettingsPage
         
-        (ok_cancel, new_max_seconds, new_max_servos, new_default_val) = \
-            DevPopup(cls.max_seconds, cls.max_servos, cls.node_default_val).show()
+        (ok_cancel, new_max_servos, new_default_val) = \
+            DevPopup(cls.max_servos, cls.node_default_val).show()
         
         # If ok button closed popup
         if ok_cancel:    
-            current_total_routine_seconds =\
-                self.num_of_seconds.get() * self.num_of_servos.get()
-            
-            if new_max_seconds < current_total_routine_seconds:
-                messagebox.showerror('Error', 'New max runtime is less than\n'\
-                    + 'current routine runtime')
-                return
-                
             if new_max_servos < self.num_of_servos.get():
                 messagebox.showerror('Error', 'New max servos is less than\n'\
                     + 'current number of servos')
                 self.destroy()
                 return
 
-            cls.max_seconds = new_max_seconds
             cls.max_servos = new_max_servos
             cls.node_default_val =\
                 self.constrain(new_default_val, 0, 180)
             
-            self.seconds_label_var.set('Routine length (in seconds)\
-                \n(1-{}):'.format(new_max_seconds))
             self.servo_label_var.set(\
                 'Number of servos (1-{})'.format(new_max_servos))
                 
@@ -266,20 +362,20 @@ class SettingsPage(ttk.Frame):
                 # Check inputs for errors
                 #~ constrain = lambda n, n_min, n_max: max(min(n, n_max), n_min)
                 
-                # Routine between 1 and (self.max_seconds)
+                # Routine at least 1 second
                 temp_secs= self.num_of_seconds.get()
-                self.num_of_seconds.set(self.constrain(temp_secs, 1, SettingsPage.max_seconds))
+                self.num_of_seconds.set(max(temp_secs, 1))
                 
                 # Maximum of SettingsPage.max_servos
                 temp_servos = self.num_of_servos.get()
                 self.num_of_servos.set(self.constrain(temp_servos, 1, SettingsPage.max_servos))
                 
-                if (self.num_of_servos.get() * \
-                        self.num_of_seconds.get()) > SettingsPage.max_seconds:
+                # All routines must fit in the board's memory
+                problems = self.budget.checkLength(self.num_of_servos.get(),
+                    (self.num_of_seconds.get()*2) + 1)
+                if problems:
                     self.resetEntries()
-                    messagebox.showerror('Limit Error', 'Total of all routines \
-                        must be less than \
-                        ({} seconds)'.format(SettingsPage.max_seconds))
+                    messagebox.showerror('Limit Error', '\n'.join(problems))
                     return
         
             except Exception as e:
@@ -323,10 +419,13 @@ class SettingsPage(ttk.Frame):
             messagebox.showerror('Error',
                 'Limit of {} servos'.format(SettingsPage.max_servos))
             return
-        if (num + 1) * self.num_of_seconds.get() > SettingsPage.max_seconds:
-            messagebox.showerror('Error',\
-                'Total routine time limited to {}'.format(SettingsPage.max_seconds)
-                + ' seconds\n\nCannot add servo')
+        
+        new_ys = [SettingsPage.node_default_val
+            for i in range((self.num_of_seconds.get()*2) + 1)]
+        problems = self.budget.check(extra=[new_ys])
+        if problems:
+            messagebox.showerror('Error', 'Cannot add servo\n\n'
+                + '\n'.join(problems))
             return
             
         #~ plot_title = 'New_Servo{}'.format(self.num + 1)
@@ -338,6 +437,61 @@ class SettingsPage(ttk.Frame):
         SettingsPage.plot_pages.append(plotPage)
         
         self.num_of_servos.set(num + 1)
+        
+        index = SettingsPage.plot_pages.index(plotPage)
+        # Once undone, only this step keeps the page
+        self.undo_stack.record(undo_stack.Action(
+            undo=lambda: self.removePage(plotPage),
+            redo=lambda: self.restorePage(plotPage, index),
+            size=len(plotPage.routine),
+            discard=lambda undone: undone and self.destroyPage(plotPage)))
+    
+    def removePage(self, page):
+        '''Take a servo's tab away, the page is kept so it can be restored'''
+        
+        SettingsPage.plot_pages.remove(page)
+        self.show.remove(page.routine)
+        self.budget.removeRoutine(page)
+        self.parent_notebook.forget(page)
+        self.num_of_servos.set(len(SettingsPage.plot_pages))
+    
+    def destroyPage(self, page):
+        '''Free a page taken away by removePage() that cannot come back'''
+        
+        self.undo_stack.unwatch(page.routine)
+        page.destroy()
+    
+    def restorePage(self, page, index):
+        '''Put a page taken away by removePage() back at index'''
+        
+        SettingsPage.plot_pages.insert(index, page)
+        self.show.add(page.routine, index)
+        self.budget.setRoutine(page, page.routine.ys)
+        
+        # Settings tab comes before the plots
+        if index == len(SettingsPage.plot_pages) - 1:
+            self.parent_notebook.add(page, text=page.name)
+        else:
+            self.parent_notebook.insert(index+1, page, text=page.name)
+        self.num_of_servos.set(len(SettingsPage.plot_pages))
+    
+    def undo(self, event=None):
+        self.refreshPages(self.undo_stack.undo())
+    
+    def redo(self, event=None):
+        self.refreshPages(self.undo_stack.redo())
+    
+    def refreshPages(self, routines):
+        '''Redraw the pages of routines changed by undo or redo'''
+        
+        for page in SettingsPage.plot_pages:
+            if page.routine in routines:
+                # Undone time changes the length
+                page.slider['to'] = (len(page.routine) // 2) - 10
+                page.plot.update()
+        
+        if SettingsPage.plot_pages:
+            self.num_of_seconds.set(SettingsPage.plot_pages[0].routine.seconds)
     
     def loadServos(self):
         '''Add additional servo(s) with previously recorded data'''
@@ -355,6 +509,14 @@ class SettingsPage(ttk.Frame):
                 self.i2c.invoke()
             else:
                 self.pins.invoke()
+            # Files saved before compression existed have no encoding
+            encoding = self.settings.get('encoding', 'full')
+            if encoding == 'compressed':
+                self.compressed.invoke()
+            elif encoding == 'keyframes':
+                self.keyframes.invoke()
+            else:
+                self.full.invoke()
             self.toggle_btn_checkbox()
             self.num_of_seconds.set(self.settings['seconds'])
             
@@ -369,64 +531,63 @@ class SettingsPage(ttk.Frame):
             return
         new_num_servos = current_servos + len(self.settings['plot_pages'])
             
-        # Prevent overloading max seconds / adjust length as necessary
+        # Prevent overloading board memory / adjust length as necessary
         current_seconds = self.num_of_seconds.get()
         loaded_seconds = int((len(self.settings['plot_pages'][0][2])-1) / 2)
         
+        # Every routine is padded to the longer of the two lengths
+        new_seconds = max(current_seconds, loaded_seconds)
+        pad = lambda ys, seconds: list(ys) +\
+            [SettingsPage.node_default_val for i in range((new_seconds-seconds) * 2)]
+        problems = self.budget.check(routines=
+            [pad(page.routine.ys, current_seconds) for page in SettingsPage.plot_pages]
+            + [pad(page[2], loaded_seconds) for page in self.settings['plot_pages']])
+        if problems:
+            messagebox.showerror('Error', 'Loading too many seconds\n\n'
+                + '\n'.join(problems))
+            return
+        
         if current_seconds > loaded_seconds:
-            if (current_seconds * new_num_servos) > SettingsPage.max_seconds:
-                messagebox.showerror('Error', 'Loading too many seconds')
-                return
-            else:
-                seconds_to_add = int(current_seconds - loaded_seconds)
-                nodes_to_add = seconds_to_add * 2
-                
-                # Add time to new loaded plots to match length of current plots
-                for page in self.settings['plot_pages']:
-                    page[2] +=\
-                        [SettingsPage.node_default_val for i in range(nodes_to_add)]
+            seconds_to_add = int(current_seconds - loaded_seconds)
+            nodes_to_add = seconds_to_add * 2
+            
+            # Add time to new loaded plots to match length of current plots
+            for page in self.settings['plot_pages']:
+                page[2] +=\
+                    [SettingsPage.node_default_val for i in range(nodes_to_add)]
                     
         elif current_seconds < loaded_seconds:
-            if (loaded_seconds * new_num_servos) > SettingsPage.max_seconds:
-                messagebox.showerror('Error', 'Loading too many seconds')
-                return
-            else:
-                seconds_to_add = int(loaded_seconds - current_seconds)
-                nodes_to_add = seconds_to_add * 2
-                
-                # Add time to current plots to match length of new loaded plots
-                for page in SettingsPage.plot_pages:
-                    page.plot.ys +=\
-                        [SettingsPage.node_default_val for i in range(nodes_to_add)]
-                    
-                    page.plot.length = len(page.plot.ys)
-                    page.plot.xs = [i for i in range(page.plot.length)]
-                    
-                    page.slider['to'] = (page.plot.length // 2) - 10
-                    page.parent.num_of_seconds.set(int((len(page.plot.ys)-1)/2))    
-                    page.plot.update()
+            seconds_to_add = int(loaded_seconds - current_seconds)
+            nodes_to_add = seconds_to_add * 2
+            
+            # Add time to current plots to match length of new loaded plots
+            for page in SettingsPage.plot_pages:
+                page.routine.append(
+                    [SettingsPage.node_default_val for i in range(nodes_to_add)])
                 
-        elif loaded_seconds == current_seconds:
-            if (loaded_seconds * new_num_servos) > SettingsPage.max_seconds:
-                messagebox.showerror('Error', 'Loading too many seconds')
-                return
+                page.slider['to'] = (len(page.routine) // 2) - 10
+                page.parent.num_of_seconds.set(page.routine.seconds)    
+                page.plot.update()
         
         for page in self.settings['plot_pages']:
             plot_title = page[0]
             tab_name = plot_title + '_tab'
-            plotPage = PlotPage(self, plot_title)
+            plotPage = PlotPage(self, plot_title, page[2])
             
             self.parent_notebook.add(plotPage, text=plot_title)
             SettingsPage.plot_pages.append(plotPage)
             
             plotPage.pin_num.set(page[1])
-            plotPage.plot.ys = page[2]
-            plotPage.plot.update()
+            plotPage.routine.setLimits(*page[3])
         
         self.num_of_servos.set(new_num_servos)
         
+        # Loading is not undone, edits before it no longer fit the routines
+        self.undo_stack.clear()
+        
         SettingsPage.initial_load_flag = True
     
+    @perf_timing.timed('sketch.output')
     def outputSketch(self):
         '''
         Output all data into a usable Arduino sketch
@@ -460,33 +621,18 @@ class SettingsPage(ttk.Frame):
             messagebox.showerror('Error', 'Repeated servo names')
             return
         
-        # Temporary data needed for template output
-        name_arr = [tab.name for tab in SettingsPage.plot_pages]
-        tweener_arrays = [
-            self.prettyOutput(self.inBetweeners(tab.plot.ys)) for tab in SettingsPage.plot_pages]
-        pin_names = ['{}_PIN'.format(tab.name) for tab in SettingsPage.plot_pages]
-        
-        # Keys for template
-        template_dict = {
-            'list_of_names' : name_arr,
-            'interval' : SettingsPage.millis,
-            'tweenerArrays': tweener_arrays,
-            'button' : pin,
-            'pinNames' : pin_names,
-            'pinNums' : pin_nums,
-            'outputType' : self.output_type_var.get()}
-        
-        # Stuff for jinja2 template
-        template_loader = jinja2.FileSystemLoader(
-            searchpath=os.path.join(os.path.dirname(__file__)))
-        template_env = jinja2.Environment(loader=template_loader)
-        template_env.globals.update(zip=zip)
-        if self.output_type_var.get() == 'i2c':
-            template_index = template_env.get_template('i2c_template.txt')
-        elif self.output_type_var.get() == 'pins':
-            template_index = template_env.get_template('pin_template.txt')
-        else:
-            raise Exception
+        # Verify the routines fit on the chosen board
+        self.updateBudget()
+        problems = self.budget.check()
+        if problems:
+            messagebox.showerror('Memory Error', '\n'.join(problems))
+            return
+        
+        template_dict = sketch_output.templateDict(
+            [tab.name for tab in SettingsPage.plot_pages], pin_nums,
+            [tab.routine.ys for tab in SettingsPage.plot_pages], pin,
+            self.output_type_var.get(), self.encoding_var.get(),
+            SettingsPage.millis)
         
         file_name = fd.asksaveasfilename(
             initialdir=os.path.join(os.path.dirname(__file__)),
@@ -495,8 +641,15 @@ class SettingsPage(ttk.Frame):
             confirmoverwrite=True)
     
         if file_name:   # Prevents error if 'cancel' is pushed
-            with open(file_name, 'w') as outFile:
-                outFile.write(template_index.render(template_dict))
+            # Rendered straight into the file with the cached template
+            sketch_output.writeSketch(file_name, self.output_type_var.get(),
+                template_dict)
+            
+            error = sketch_output.cacheError()
+            if error:
+                print(error)
+                messagebox.showwarning('Warning', 'Sketch templates cannot '
+                    'be cached, every session parses them again\n\n{}'.format(error))
     
     @classmethod
     def inBetweeners(cls, arr):
@@ -505,37 +658,17 @@ class SettingsPage(ttk.Frame):
         for smooth servo movement 
         '''
         
-        temp_arr = []
-        divisor = int(500/cls.millis)
-        
-        for index, value in enumerate(arr):
-            try:
-                step = (arr[index+1] - value) / divisor
-                for i in range(divisor):
-                    temp_arr.append(round(value + (step*i)))
-            except IndexError:
-                temp_arr.append(value)
-        
-        return temp_arr
+        return sketch_output.inBetweeners(arr, cls.millis)[0].tolist()
     
     def saveData(self):
         '''Save relevent info to file for later use'''
     
         try:
-            info_dict = {
-                         'seconds' : self.num_of_seconds.get(),
-                         'plot_pages' : [],
-                         'button_#' : self.button_entry_val.get(),
-                         'output_type': self.output_type_var.get()
-                        }
-        
+            self.show.button = self.button_entry_val.get()
+            self.show.output_type = self.output_type_var.get()
+            self.show.encoding = self.encoding_var.get()
             for page in self.plot_pages:
-                temp = []
-                temp.append(page.name)
-                temp.append(page.pin_num.get())
-                temp.append(page.plot.ys)
-            
-                info_dict['plot_pages'].append(temp)
+                page.routine.pin = page.pin_num.get()
             
             file_name = fd.asksaveasfilename(
                 initialdir=os.path.join(os.path.dirname(__file__)),
@@ -544,8 +677,8 @@ class SettingsPage(ttk.Frame):
                 confirmoverwrite=True)
             
             if file_name:   # Prevents error if dialog canceled
-                with open(file_name, 'wb') as writer:
-                    dill.dump(info_dict, writer)
+                servo_file.save(file_name, self.show)
+                self.journal.saved()
             
         except Exception as e:
             print('Error saving...')
@@ -560,14 +693,74 @@ class SettingsPage(ttk.Frame):
                 title='Load Settings')
             
         if file_name:
-            SettingsPage.load_flag = True
-            
-            with open(file_name, 'rb') as reader:
-                self.settings = dill.load(reader)
-            
-            self.generatePlots()
-            
-            del self.settings
+            self.loadFile(file_name)
+    
+    def loadFile(self, file_name):
+        '''Add the servos saved in file_name'''
+        
+        try:
+            # Files saved with dill by older versions load as well
+            show = servo_file.load(file_name)
+        except Exception as e:
+            print(e)
+            messagebox.showerror('Error', 'Cannot load {}'.format(
+                os.path.basename(file_name)))
+            return
+        
+        # Loaded into an empty show, the show is just what is in the file
+        was_empty = not self.show.routines
+        self.loadShow(show)
+        if was_empty and self.show.routines:
+            self.journal.saved()
+    
+    def loadShow(self, show):
+        '''Add the servos of a routine_model.Show'''
+        
+        self.settings = show.toSettings()
+        SettingsPage.load_flag = True
+        
+        self.generatePlots()
+        
+        del self.settings
+    
+    def startJournal(self):
+        '''Offer to recover unsaved edits of the last session, then start recording edits'''
+        
+        recovered = False
+        if self.journal.hasWork():
+            recover = messagebox.askyesno('Recover',
+                'The last session closed with unsaved changes.\nRecover them?')
+            if recover:
+                try:
+                    show = self.journal.recover()
+                except Exception as e:
+                    print(e)
+                    messagebox.showerror('Error', 'Cannot recover changes')
+                else:
+                    if show.routines:
+                        self.loadShow(show)
+                        recovered = bool(self.show.routines)
+        
+        # Recovered changes are kept until they are saved
+        self.journal.start(self.show, unsaved=recovered)
+    
+    def openLibrary(self):
+        '''Choose a show from the library, shows that would not fit cannot be chosen'''
+        
+        if self.library is None:
+            self.library = show_library.ShowLibrary(SettingsPage.library_dir)
+        # Only files changed since the last time are read
+        self.library.refresh()
+        self.updateBudget()
+        
+        num_servos = len(SettingsPage.plot_pages)
+        seconds = self.show.seconds if num_servos else 0
+        check = lambda name: self.library.check(name, self.budget,
+            num_servos, SettingsPage.max_servos, seconds)
+        
+        file_name = LibraryPopup(self.library, check).show()
+        if file_name:
+            self.loadFile(file_name)
     
     @staticmethod
     def constrain(n, n_min, n_max):
@@ -579,13 +772,9 @@ class SettingsPage(ttk.Frame):
     def prettyOutput(arr):
         '''Outputs the plot values array in more human readable form'''
     
-        tmp_str = ''
-        for index, num in enumerate(arr):
-            if (index+1) % 10 != 0:
-                tmp_str += '{}, '.format(num).rjust(5)
-            else:
-                tmp_str += '{},\n'.format(num).rjust(5)
-        return tmp_str 
+        buffer = io.StringIO()
+        sketch_output.writePretty(arr, buffer)
+        return buffer.getvalue()
 
     
 class PlotPage(ttk.Frame):
@@ -593,42 +782,53 @@ class PlotPage(ttk.Frame):
     
     total_pages = 0
     
-    def __init__(self, parent, name):
+    def __init__(self, parent, name, values=None):
         super().__init__()
         
         PlotPage.total_pages += 1
         
         self.plot_num = PlotPage.total_pages
         self.parent = parent
-        self.name = name    # Child plot uses this for title
+        
+        # New servos hold the default value for the whole routine
+        if values is None:
+            values = [parent.node_default_val
+                for i in range((parent.num_of_seconds.get()*2) + 1)]
+        self.routine = routine_model.Routine(name, values)
+        self.parent.show.add(self.routine)
+        self.parent.undo_stack.watch(self.routine)
 
         self.buildPage()
     
+    @property
+    def name(self):
+        '''Child plot uses this for title'''
+        return self.routine.name
+    
+    @name.setter
+    def name(self, name):
+        self.routine.name = name
+    
+    def onPinChanged(self, *args):
+        '''Keep the routine's pin up to date for the autosave'''
+        
+        try:
+            self.routine.pin = self.pin_num.get()
+        except tk.TclError:
+            return    # Part typed or not a number
+        self.parent.journal.touch(self.routine)
+    
     def buildPage(self):
         '''Layout widgets for the tab'''
         
         self.pin_num = tk.IntVar()        
-        
-        # ----- Matplotlib Plot -----
+        self.pin_num.trace_add('write', self.onPinChanged)
         
         # Plot instance, bound to tab instance
-        self.plot = Plot(self, self.parent.num_of_seconds.get(), self.plot_num)
-        
-        # Drawing area for the graph
-        self.canvas = FigureCanvasTkAgg(self.plot.fig, master=self)
-        # Bind mouse events to self.canvas to change data
-        self.canvas.mpl_connect('pick_event', self.plot.onNodeClick)
-        self.canvas.mpl_connect('button_release_event', self.plot.onRelease)
-        self.canvas.mpl_connect('motion_notify_event', self.plot.onMotion)
-        
-        self.canvas.mpl_connect('button_press_event', self.plot.onClick)
-        self.canvas.mpl_connect('key_release_event', self.plot.onDelKey)
-        
-        # Create SpanSelector widget after canvas is created
-        self.plot.span = self.plot.createSpanSelector()
-        
-        # ----- End of Matplotlib plot -----
-        
+        # Its figure and canvas are made when the tab is first shown
+        self.plot = Plot(self, self.routine, self.plot_num)
+        self.parent.budget.setRoutine(self, self.routine.ys)
+        self.canvas = None
         
         # To scroll along the plot
         # Upper limit is seconds minus half the length of the plot 'x_window'
@@ -650,11 +850,10 @@ class PlotPage(ttk.Frame):
         self.settings_button = ttk.Button(button_frame, text='Settings',
             command=self.settingsDisplay)
         
-        # Grid widgets into tab
-        self.canvas.get_tk_widget().grid(columnspan=3)
-        self.slider.grid(columnspan=3)
+        # Grid widgets into tab, canvas goes in row 0 once it is made
+        self.slider.grid(row=1, columnspan=3)
         
-        pin_assign_frame.grid(sticky=tk.W)
+        pin_assign_frame.grid(row=2, sticky=tk.W)
         pin_label.grid()
         self.pin_entry.grid(row=0, column=1)
         
@@ -662,9 +861,59 @@ class PlotPage(ttk.Frame):
         
         self.settings_button.pack(padx=5, side=tk.RIGHT)
 
+    def isShown(self):
+        return self.parent.parent_notebook.select() == str(self)
+    
+    def showPlot(self):
+        '''Make the plot's figure on first view, redraw it if it changed while hidden'''
+        
+        if self.canvas is None:
+            # Only imported once a plot is first looked at
+            from matplotlib import use as Use
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            
+            # Needed to embed matplotlib in tkinter
+            Use('TkAgg')
+            
+            self.plot.buildFigure()
+            
+            # ----- Matplotlib Plot -----
+            
+            # Drawing area for the graph
+            self.canvas = FigureCanvasTkAgg(self.plot.fig, master=self)
+            # Bind mouse events to self.canvas to change data
+            self.canvas.mpl_connect('pick_event', self.plot.onNodeClick)
+            self.canvas.mpl_connect('button_release_event', self.plot.onRelease)
+            self.canvas.mpl_connect('motion_notify_event', self.plot.onMotion)
+            
+            self.canvas.mpl_connect('button_press_event', self.plot.onClick)
+            self.canvas.mpl_connect('key_release_event', self.plot.onDelKey)
+            self.canvas.mpl_connect('draw_event', self.plot.onDraw)
+            self.canvas.mpl_connect('button_press_event', self.plot.overview.onClick)
+            self.plot.overview.jump = self.jumpTo
+            
+            # Create SpanSelector widget after canvas is created
+            self.plot.span = self.plot.createSpanSelector()
+            
+            # ----- End of Matplotlib plot -----
+            
+            self.canvas.get_tk_widget().grid(row=0, columnspan=3)
+        
+        if self.plot.stale:
+            self.plot.update()
+    
     def updateSliderPos(self, event):
         self.plot.scale_pos = self.slider.get()
         self.plot.update()
+    
+    def jumpTo(self, node):
+        '''Centre the plot on a node clicked in the overview'''
+        
+        seconds = max(min(node/2 - 5, self.slider['to']), 0)
+        self.slider.set(seconds)
+        # Setting the slider may already have moved the plot
+        if self.plot.scale_pos != self.slider.get():
+            self.updateSliderPos(None)
 
     def settingsDisplay(self):
         '''Add settings tabs to empty settings popup'''
@@ -699,11 +948,24 @@ class PlotPage(ttk.Frame):
         self.parent.parent_notebook.tab(index, text=name)
         # change title on plot
         self.name = name
+        self.parent.journal.touch(self.routine)
         self.plot.update()
             
     def changeLimits(self, values):
-        self.plot.upper_limit = values[0]
-        self.plot.lower_limit = values[1]
+        old = (self.routine.lower_limit, self.routine.upper_limit)
+        new = (values[1], values[0])
+        
+        # Nodes moved inside the new limits are undone with them
+        self.parent.undo_stack.begin()
+        self.applyLimits(*new)
+        self.parent.undo_stack.record(undo_stack.Action(
+            undo=lambda: self.applyLimits(*old),
+            redo=lambda: self.applyLimits(*new)))
+        self.parent.undo_stack.end()
+    
+    def applyLimits(self, lower_limit, upper_limit):
+        self.routine.setLimits(lower_limit, upper_limit)
+        self.parent.journal.touch(self.routine)
         
         self.plot.update()
     
@@ -711,81 +973,79 @@ class PlotPage(ttk.Frame):
         where = values[0]
         seconds = values[1]
         
-        for page in self.parent.plot_pages:
-            
-            # Verify not going over SettingsPage.max_seconds total (Arduino memory limit)
-            temp_length = ( (len(page.plot.ys)-1)/2 ) + (seconds)
-                
-            if (temp_length * len(self.parent.plot_pages)) > \
-                self.parent.max_seconds:
-                    
-                messagebox.showerror('Limit Error', 'Total of all routines' +
-                    'must be less than ' + 
-                    '({} seconds)'.format(page.parent.max_seconds))
-                    
-                return
+        # Verify longer routines still fit in Arduino memory
+        problems = self.parent.budget.check(routines=
+            [list(page.routine.ys) + [self.parent.node_default_val for i in range(seconds * 2)]
+                for page in self.parent.plot_pages])
+        if problems:
+            messagebox.showerror('Limit Error', '\n'.join(problems))
+            return
         
+        # Time added to every servo is undone together
+        self.parent.undo_stack.begin()
+        for page in self.parent.plot_pages:
             temp_arr = [page.parent.node_default_val for i in range(seconds * 2)]
             
             if where == 'begin':
-                page.plot.ys = temp_arr + page.plot.ys
-                page.plot.length = len(page.plot.ys)
-                page.plot.xs = [i for i in range(page.plot.length)]
+                page.routine.insert(0, temp_arr)
                 
             elif where == 'end':
-                page.plot.ys += temp_arr
-                page.plot.length = len(page.plot.ys)
-                page.plot.xs = [i for i in range(page.plot.length)]
+                page.routine.append(temp_arr)
             
             # Update slider length to scroll along the plot
             # Upper limit is seconds minus half the length of the plot 'x_window'
-            page.slider['to'] = (page.plot.length // 2) - 10
+            page.slider['to'] = (len(page.routine) // 2) - 10
             page.slider.set(0)
-            page.parent.num_of_seconds.set(int((len(page.plot.ys)-1)/2))
+            page.parent.num_of_seconds.set(page.routine.seconds)
             
             # Redraw the plot
             page.plot.update()
+        self.parent.undo_stack.end()
     
     def removeTime(self, values):
         where = values[0]
         seconds = values[1]
-
+        
+        nodes_to_remove = seconds * 2
+        
+        # Verify plot will still exist
+        if nodes_to_remove >= (len(self.routine) - 1):
+            messagebox.showerror('Error',
+                'Removing too many seconds')
+            return
+        
+        # Time removed from every servo is undone together
+        self.parent.undo_stack.begin()
         for page in self.parent.plot_pages:
             
-            nodes_to_remove = seconds * 2
-            
-            # Verify plot will still exist
-            if nodes_to_remove >= (len(page.plot.ys) - 1):
-                messagebox.showerror('Error',
-                    'Removing too many seconds')
-                return
-                        
             if where == 'begin':
-                del page.plot.ys[:nodes_to_remove]
-                page.plot.length = len(page.plot.ys)
-                page.plot.xs = [i for i in range(page.plot.length)]
+                page.routine.delete(0, nodes_to_remove)
                 
             elif where == 'end':
-                del page.plot.ys[-nodes_to_remove:]
-                page.plot.length = len(page.plot.ys)
-                page.plot.xs = [i for i in range(page.plot.length)]
+                page.routine.delete(len(page.routine) - nodes_to_remove,
+                    len(page.routine))
             
             # Update slider length to scroll along the plot
             # Upper limit is seconds minus half the length of the plot 'x_window'
-            page.slider['to'] = (page.plot.length // 2) - 10
+            page.slider['to'] = (len(page.routine) // 2) - 10
             page.slider.set(0)
-            #~ page.parent.num_of_seconds.set(int((len(page.plot.ys)-1)/2))
-            page.parent.num_of_seconds.set( int((page.plot.length)-1) /2)
+            page.parent.num_of_seconds.set(page.routine.seconds)
             
             # Redraw the plots
             page.plot.update()
+        self.parent.undo_stack.end()
     
     def deleteServo(self, values):
-        name = self.name + '_tab'
-                
-        self.parent.plot_pages.remove(self)
-        self.parent.parent_notebook.forget(self)
-        self.parent.num_of_servos.set(len(self.parent.plot_pages))
+        index = self.parent.plot_pages.index(self)
+        
+        self.parent.removePage(self)
+        # Page keeps its routine, undo puts it back. Only this step
+        # keeps the page while it is deleted
+        self.parent.undo_stack.record(undo_stack.Action(
+            undo=lambda: self.parent.restorePage(self, index),
+            redo=lambda: self.parent.removePage(self),
+            size=len(self.routine),
+            discard=lambda undone: not undone and self.parent.destroyPage(self)))
         
 
 class Plot():
@@ -794,56 +1054,110 @@ class Plot():
     animating the interactive plot, is a child of a PlotPage object
     '''
     
-    def __init__(self, parent, seconds, num):
+    def __init__(self, parent, routine, num):
         self.parent = parent
         
+        # Routine holds the data, the plot redraws when it changes
+        self.routine = routine
+        self.routine.observe(self.onRoutineChanged)
+        
         self.scale_pos = 0
         self.num = num                 # Which number servo, for plot title
-        self.length = (seconds*2)+1    # Number of nodes in plot, 2 per second
         
         self.node_clicked = False       # Node follows mouse only when clicked
         self.point_index = None        # Track which node has been selected
         
         # For keeping values within range of servo degrees
-        self.upper_limit = 179
-        self.lower_limit = 0
         self.limit_range = lambda n: max(min(self.upper_limit, n), self.lower_limit)
         
-        # Initial Graph -----
-        self.fig = Figure(figsize=(10,5), dpi=100)
-        self.fig.subplots_adjust(bottom=0.18)
-        self.ax = self.fig.add_subplot(111)
-        
-        self.xs = [i for i in range(self.length)]
-        self.ys = [self.parent.parent.node_default_val for i in self.xs]
+        # Figure is made when its tab is first shown, see buildFigure()
+        self.fig = None
+        self.stale = True              # Changed since it was last drawn
+        self.changed = None            # Nodes the overview has not seen
+        self.nodesChanged()
         
         # To hold values from span selector
         self.span_xs = []
         self.selection = False
         
+        # Axes without the line and nodes, restored while dragging a node
+        self.background = None
+        
+        # Nodes on the line and nodes artists, see drawPlot()
+        self.window_start = 0
+        self.window_end = 0
+    
+    @property
+    def ys(self):
+        return self.routine.ys
+    
+    @property
+    def upper_limit(self):
+        return self.routine.upper_limit
+    
+    @property
+    def lower_limit(self):
+        return self.routine.lower_limit
+    
+    def onRoutineChanged(self, routine, start, old, new):
+        '''Routine was edited, redraw the changed nodes on the next update'''
+        
+        if len(old) == len(new):
+            self.nodesChanged(start, start+len(new))
+        else:
+            self.nodesChanged(start, len(routine))
+        self.stale = True
+        
+        # Memory use of this servo is worked out again when next needed
+        self.parent.parent.budget.setRoutine(self.parent, routine.ys)
+    
+    def buildFigure(self):
+        '''Make the figure, only needed once the plot is seen'''
+        
+        from matplotlib.figure import Figure
+        
+        # Initial Graph -----
+        self.fig = Figure(figsize=(10,5), dpi=100)
+        self.fig.subplots_adjust(bottom=0.27)
+        self.ax = self.fig.add_subplot(111)
+        
+        # Whole routine in a strip under the plot
+        self.overview = plot_overview.Overview(self.fig, self.ax)
+        self.nodesChanged()
         
         self.setPlot()
-        self.drawPlot()
     
     def setPlot(self):
         '''Elements of the plot which do not need to be redrawn every update '''
         
+        from matplotlib.ticker import FuncFormatter, MultipleLocator
+        
         self.ax.set_ylim([-10,190])
         self.ax.set_yticks(range(0,190,20))
         
+        # A tick on every node, labelled in seconds
+        self.ax.xaxis.set_major_locator(MultipleLocator(1))
+        self.ax.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: str(x/2)))
+        self.ax.tick_params(axis='x', labelrotation=45)
+        
         self.ax.grid(alpha=.5)
         self.ax.set_xlabel('Seconds')
         self.ax.set_ylabel('Degree of Motion', fontname='BPG Courier GPL&GNU',
             fontsize=14)
         
-    def clearPlotLines(self):
-        '''Remove plotted lines so they can be redrawn'''
+        # Artists are made once, drawPlot() only changes their data
+        # Plot upper and lower limits
+        self.upper = self.ax.axhline(self.upper_limit, color='k',
+            linestyle='--', alpha=.6, linewidth=1)
+        self.lower = self.ax.axhline(self.lower_limit, color='k',
+            linestyle='--', alpha=.6, linewidth=1)
         
-        self.line.remove()
-        self.nodes.remove()
-        self.upper.remove()
-        self.lower.remove()
-       
+        # Line
+        self.line, = self.ax.plot([], [], color='orange', markersize=10)
+        
+        # Clickable nodes
+        self.nodes, = self.ax.plot([], [], 'k.', markersize=10, picker=5.0)
+    
     def drawPlot(self):
         '''Draw the actual plot'''
         
@@ -853,32 +1167,46 @@ class Plot():
         pos = round(self.scale_pos*2)   # scale_pos is in seconds, pos is in ticks
         pos = max(pos, 0)               
         
-        # Confine y-values to within upper and lower limits
-        self.ys = [self.limit_range(node) for node in self.ys]
-        
         # Only 'x_window' of plot is viewable
         self.ax.set_xlim([pos-.5, pos+x_window+.5])
-        self.ax.set_xticks([i for i in range(pos, pos+x_window+1)])
-        self.ax.set_xticklabels([i/2 for i in self.ax.get_xticks()])
-        for tick in self.ax.get_xticklabels():
-            tick.set_rotation(45)
+        self.overview.showView(pos, pos+x_window)
         
-        #~ # Plot upper and lower limits
-        self.upper, = self.ax.plot(self.xs, [self.upper_limit for i in self.xs],
-            'k--', alpha=.6, linewidth=1)
-        self.lower, = self.ax.plot(self.xs, [self.lower_limit for i in self.xs],
-            'k--', alpha=.6, linewidth=1)
+        # Lines only hold the visible nodes, plus one each side so the
+        # line runs off the edges
+        self.window_start = max(pos-1, 0)
+        self.window_end = pos + x_window + 2
         
-        # Line
-        self.line, = self.ax.plot(self.xs, self.ys, color='orange',
-            markersize=10)
-            
-        # Clickable nodes
-        self.nodes, = self.ax.plot(self.xs, self.ys, 'k.', 
-            markersize=10, picker=5.0)
+        self.upper.set_ydata([self.upper_limit]*2)
+        self.lower.set_ydata([self.lower_limit]*2)
+        
+        self.setLineData()
+    
+    def setLineData(self):
+        '''Show the visible part of the routine on the line and nodes'''
+        
+        xs = range(self.window_start, min(self.window_end, len(self.ys)))
+        ys = self.ys[self.window_start:self.window_end]
+        
+        self.line.set_data(xs, ys)
+        self.nodes.set_data(xs, ys)
+    
+    def nodesChanged(self, start=0, end=None):
+        '''
+        Nodes start to end have new values, the whole routine if end
+        is None. The overview redoes them on the next update
+        '''
+        
+        if end is None or self.changed == (0, None):
+            self.changed = (0, None)
+        elif self.changed is None:
+            self.changed = (start, end)
+        else:
+            self.changed = (min(start, self.changed[0]), max(end, self.changed[1]))
    
     def createSpanSelector(self):
         '''Creates span selector widget'''
+        
+        from matplotlib.widgets import SpanSelector
     
         return SpanSelector(self.ax, self.spanSelect, 'horizontal',
                     useblit=True, span_stays=False, button=1, minspan=.05,
@@ -890,11 +1218,15 @@ class Plot():
         #~ point = event.artist
         index = event.ind
         
-        self.point_index = int(index[0])
+        # Nodes artist only holds the visible part of the routine
+        self.point_index = int(index[0]) + self.window_start
         
         # Single-click
         if not event.mouseevent.dblclick:
             self.node_clicked = True
+            # Whole drag is one step of undo
+            self.parent.parent.undo_stack.begin()
+            self.startBlit()
             
         # Double-click
         else:
@@ -902,18 +1234,17 @@ class Plot():
             # If node is double-clicked open popup to change value
             sleep(.1)  # Needs short delay
 
-            current_val = self.ys[self.point_index]
+            current_val = int(self.ys[self.point_index])
             new_val, ok_cancel = ValuePopup(current_val).show()
             
             # If 'ok button' closed ValuePopup
             if ok_cancel:
                 # Update app points in highlight to value from ValuePopup
                 if self.selection:
-                    for xp in self.span_xs:
-                        selected_index = self.xs.index(xp)
-                        self.ys[selected_index] = new_val
+                    self.routine.splice(self.span_xs[0], self.span_xs[-1]+1,
+                        [new_val for xp in self.span_xs])
                 else:
-                    self.ys[self.point_index] = new_val
+                    self.routine.set(self.point_index, new_val)
             
                 self.update()
     
@@ -922,11 +1253,10 @@ class Plot():
         
         constrain = lambda n, n_min, n_max: max(min(n, n_max), n_min)
         
-        xmin = constrain(ceil(x_min), 0, len(self.xs))
-        xmax = constrain(ceil(x_max), 0, len(self.xs))
+        xmin = constrain(ceil(x_min), 0, len(self.routine))
+        xmax = constrain(ceil(x_max), 0, len(self.routine))
         
-        selected_xs = self.xs[xmin:xmax]
-        selected_ys = self.ys[xmin:xmax]
+        selected_xs = list(range(xmin, xmax))
         
         if len(selected_xs) <= 1:
             self.span_xs = []
@@ -935,6 +1265,8 @@ class Plot():
         # Store selected points into lists
         self.span_xs = selected_xs
         
+        from matplotlib.patches import Rectangle
+        
         # Create rectangle that remains, hightlighting selection
         self.highlight_rect = Rectangle((x_min, -10), width=(x_max-x_min),
             height=200, angle=0, **dict(alpha=0.35, facecolor='lightskyblue'))
@@ -949,6 +1281,10 @@ class Plot():
         # Bring focus back to canvas 
         self.parent.canvas._tkcanvas.focus_set()
         
+        # Overview handles its own clicks
+        if event.inaxes is self.overview.ax:
+            return
+        
         if event.button == 1:
             # If moving a node, deactivate spanselector
             if self.node_clicked:
@@ -966,25 +1302,27 @@ class Plot():
         elif event.button == 3:
             self.removeHighlight()
         
+    @perf_timing.timed('plot.motion')
     def onMotion(self, event):
         '''Mouse can drag nodes'''
         
-        if self.node_clicked and event.inaxes:
-            prev_y_value = self.ys[self.point_index]
+        if self.node_clicked and event.inaxes is self.ax:
+            prev_y_value = int(self.ys[self.point_index])
             
             # Point follows mouse on y-axis
-            self.ys[self.point_index] = int(round(self.limit_range(event.ydata)))
-            node_diff = (self.ys[self.point_index] - prev_y_value)
+            new_y_value = int(round(self.limit_range(event.ydata)))
+            node_diff = new_y_value - prev_y_value
             
-            # Update highlighted point lists
-            if self.selection:
-                
-                #~ print('node index', self.point_index)
-                for xp in self.span_xs:
-                    if xp != self.point_index:
-                        self.ys[xp] += node_diff
+            # Highlighted points all move together
+            if self.selection and self.point_index in self.span_xs:
+                first = self.span_xs[0]
+                moved = self.ys[first:self.span_xs[-1]+1].astype(int) + node_diff
+                moved[self.point_index - first] = new_y_value
+                self.routine.splice(first, self.span_xs[-1]+1, moved)
+            else:
+                self.routine.set(self.point_index, new_y_value)
             
-            self.update()
+            self.blit()
     
     def onRelease(self, event):
         # Spanselector deactivates on certain mouse events,
@@ -994,6 +1332,56 @@ class Plot():
         if self.point_index is not None:
             self.node_clicked = False
             self.point_index = None
+            self.parent.parent.undo_stack.end()
+        
+        # Drag is over, full redraw puts the lines back in the figure
+        if self.background is not None:
+            self.stopBlit()
+            self.update()
+    
+    def startBlit(self):
+        '''
+        Draw everything except the line and nodes once and keep it,
+        so dragging a node only redraws those two artists
+        '''
+        
+        self.line.set_animated(True)
+        self.nodes.set_animated(True)
+        
+        canvas = self.fig.canvas
+        canvas.draw()
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        
+        self.blit()
+    
+    def blit(self):
+        '''Redraw only the line and nodes over the cached background'''
+        
+        if self.background is None:
+            self.update()
+            return
+        
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        
+        self.setLineData()
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.nodes)
+        
+        canvas.blit(self.ax.bbox)
+    
+    def stopBlit(self):
+        self.background = None
+        self.line.set_animated(False)
+        self.nodes.set_animated(False)
+    
+    def onDraw(self, event):
+        '''A full draw while dragging, e.g. window exposed, needs a new background'''
+        
+        if self.background is not None:
+            self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+            self.ax.draw_artist(self.line)
+            self.ax.draw_artist(self.nodes)
     
     def removeHighlight(self):
         '''Removes highlight rect from plot'''
@@ -1016,27 +1404,38 @@ class Plot():
                 message='Delete nodes?')
                 
             if answer:
+                self.parent.parent.undo_stack.begin()
                 # Delete selected nodes
-                del self.xs[self.span_xs[0]: self.span_xs[-1]+1]
-                del self.ys[self.span_xs[0]: self.span_xs[-1]+1]
+                self.routine.delete(self.span_xs[0], self.span_xs[-1]+1)
                 
                 # Add default nodes to end to maintain routine length
-                self.xs += [0 for i in self.span_xs]
-                self.ys += [self.parent.parent.node_default_val for i in self.span_xs]
-                # Re-number xs
-                self.xs = [index for index, val in enumerate(self.xs)]
+                self.routine.append(
+                    [self.parent.parent.node_default_val for i in self.span_xs])
+                self.parent.parent.undo_stack.end()
                 
                 self.removeHighlight()
                 
                 self.update()
         
+    @perf_timing.timed('plot.update')
     def update(self):
         '''Re-draw plot after moving a point'''
 
-        self.clearPlotLines()
+        # Hidden plots are drawn when their tab is shown
+        if self.fig is None or not self.parent.isShown():
+            self.stale = True
+            return
+        
+        # Routines that changed length are redone in full
+        if len(self.ys) != self.overview.envelope.length:
+            self.nodesChanged()
+        if self.changed is not None:
+            self.overview.update(self.ys, *self.changed)
+            self.changed = None
         
         self.drawPlot()
         self.fig.canvas.draw()
+        self.stale = False
         
     
     
@@ -1,11 +1,15 @@
 
 import tkinter as tk
 
+from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
 
 import traceback
 
+import perf_timing
+import sampling_profiler
+
 
 class Popup(tk.Toplevel):
     '''Generic top level pop-up window'''
@@ -157,10 +161,9 @@ class HelpPopup(Popup):
                 
 class DevPopup(Popup):
      
-    def __init__(self, seconds, servos, default_val):
-        super().__init__(title='Dev Page', geometry='250x150')
+    def __init__(self, servos, default_val):
+        super().__init__(title='Dev Page', geometry='250x120')
          
-        self.seconds = seconds
         self.servos = servos
         self.default_val = default_val
         
@@ -170,19 +173,13 @@ class DevPopup(Popup):
          
     def buildPage(self):
         
-        self.new_seconds_var = tk.IntVar()
         self.new_servos_var = tk.IntVar()
         self.new_node_default_val = tk.IntVar()
-        self.new_seconds_var.set(self.seconds)
         self.new_servos_var.set(self.servos)
         self.new_node_default_val.set(self.default_val)
         
         main_frame = ttk.Frame(self, padding=5)
         
-        seconds_label = ttk.Label(main_frame, text='Total runtime (seconds)')
-        seconds_entry = ttk.Entry(main_frame, textvariable=self.new_seconds_var,
-            width=6)
-        
         servos_label = ttk.Label(main_frame, text='Total number of servos')
         servos_entry = ttk.Entry(main_frame, textvariable=self.new_servos_var,
             width=6)
@@ -199,12 +196,10 @@ class DevPopup(Popup):
         
         main_frame.pack(fill=tk.BOTH, expand=1)
         
-        seconds_label.grid(row=0, column=0)
-        seconds_entry.grid(row=0, column=1)
-        servos_label.grid(row=1, column=0)
-        servos_entry.grid(row=1, column=1)
-        default_label.grid(row=2, column=0)
-        default_entry.grid(row=2, column=1)
+        servos_label.grid(row=0, column=0)
+        servos_entry.grid(row=0, column=1)
+        default_label.grid(row=1, column=0)
+        default_entry.grid(row=1, column=1)
         
         button_frame.grid(columnspan=2, pady=10)
         ok_button.pack(side=tk.LEFT)
@@ -213,7 +208,6 @@ class DevPopup(Popup):
     def update(self):
         
         try:
-            self.new_seconds_var.get()
             self.new_servos_var.get() 
             self.new_node_default_val.get()           
         except Exception as e:
@@ -229,11 +223,301 @@ class DevPopup(Popup):
         
         if self.send_data:
             return ( True,
-                     self.new_seconds_var.get(),
                      self.new_servos_var.get(),
                      self.new_node_default_val.get() )
         else:
-            return ( False, None, None, None )
+            return ( False, None, None )
     
     
 
+class LibraryPopup(Popup):
+    '''
+    Lists the shows of a show_library.ShowLibrary, returns the file
+    chosen. check(name) gives the reasons a show cannot be loaded
+    '''
+    
+    def __init__(self, library, check, title='Show Library'):
+        super().__init__(title)
+        
+        self.library = library
+        self.check = check
+        self.chosen = None
+        
+        self.buildPage()
+        self.fillList()
+    
+    def buildPage(self):
+        self.filter_var = tk.StringVar()
+        self.problems_var = tk.StringVar()
+        
+        main_frame = ttk.Frame(self, padding=5)
+        
+        filter_label = ttk.Label(main_frame, text='Filter')
+        filter_entry = ttk.Entry(main_frame, textvariable=self.filter_var)
+        filter_entry.focus()
+        filter_entry.bind('<KeyRelease>', lambda event: self.fillList())
+        
+        columns = ('servos', 'seconds', 'output')
+        self.show_list = ttk.Treeview(main_frame, columns=columns, height=12,
+            selectmode='browse')
+        self.show_list.heading('#0', text='File')
+        self.show_list.heading('servos', text='Servos')
+        self.show_list.heading('seconds', text='Seconds')
+        self.show_list.heading('output', text='Output')
+        self.show_list.column('#0', width=200)
+        for column in columns:
+            self.show_list.column(column, width=70, anchor=tk.E)
+        self.show_list.bind('<<TreeviewSelect>>', self.onSelect)
+        self.show_list.bind('<Double-1>', self.update)
+        
+        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL,
+            command=self.show_list.yview)
+        self.show_list.config(yscrollcommand=scrollbar.set)
+        
+        # Each servo's routine, squeezed into the width of the list
+        self.thumbnail = tk.Canvas(main_frame, width=410, height=60,
+            bg='#ffffff')
+        problems_label = ttk.Label(main_frame, textvariable=self.problems_var,
+            foreground='red', wraplength=410)
+        
+        button_frame = ttk.Frame(main_frame)
+        self.load_button = ttk.Button(button_frame, text='Load',
+            command=self.update, state='disabled')
+        cancel_button = ttk.Button(button_frame, text='Cancel',
+            command=self.destroy)
+        
+        main_frame.pack(fill=tk.BOTH, expand=1)
+        
+        filter_label.grid(row=0, column=0, sticky=tk.W)
+        filter_entry.grid(row=0, column=1, sticky=tk.EW, pady=5)
+        self.show_list.grid(row=1, column=0, columnspan=2)
+        scrollbar.grid(row=1, column=2, sticky=tk.NS)
+        self.thumbnail.grid(row=2, column=0, columnspan=2, pady=5)
+        problems_label.grid(row=3, column=0, columnspan=2, sticky=tk.W)
+        
+        button_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        self.load_button.pack(padx=5, side=tk.LEFT)
+        cancel_button.pack(padx=5, side=tk.RIGHT)
+    
+    def fillList(self):
+        self.show_list.delete(*self.show_list.get_children())
+        
+        for name in self.library.filter(self.filter_var.get()):
+            entry = self.library.entries[name]
+            if 'error' in entry:
+                values = ('', '', 'unreadable')
+            elif entry.get('legacy'):
+                values = ('', '', 'old format')
+            else:
+                values = (len(entry['names']), entry['seconds'],
+                    entry['output_type'])
+            self.show_list.insert('', tk.END, iid=name, text=name,
+                values=values)
+        
+        self.onSelect()
+    
+    def onSelect(self, event=None):
+        selected = self.show_list.selection()
+        self.thumbnail.delete(tk.ALL)
+        
+        if not selected:
+            self.problems_var.set('')
+            self.load_button['state'] = 'disabled'
+            return
+        
+        name = selected[0]
+        self.drawThumbnail(self.library.thumbnails[name])
+        
+        problems = self.check(name)
+        if self.library.entries[name].get('legacy'):
+            self.problems_var.set('\n'.join(problems + ['Saved by an older '
+                'version, load it then save it to convert']))
+        else:
+            self.problems_var.set('\n'.join(problems))
+        self.load_button['state'] = 'disabled' if problems else 'normal'
+    
+    def drawThumbnail(self, thumbnail):
+        '''One line from lowest to highest value for every column'''
+        
+        colours = ('#ff8c00', '#1f77b4', '#2ca02c', '#d62728')
+        width = int(self.thumbnail['width'])
+        height = int(self.thumbnail['height'])
+        
+        for servo, (lows, highs) in enumerate(thumbnail):
+            step = width / max(len(lows), 1)
+            for column, (low, high) in enumerate(zip(lows, highs)):
+                x = (column + .5) * step
+                self.thumbnail.create_line(x, height - low*height/180,
+                    x, height - high*height/180 - 1,
+                    fill=colours[servo % len(colours)], width=max(step-1, 1))
+    
+    def update(self, event=None):
+        if str(self.load_button['state']) == 'disabled':
+            return
+        
+        self.chosen = self.library.path(self.show_list.selection()[0])
+        self.destroy()
+    
+    def show(self):
+        self.wait_window()
+        
+        return self.chosen
+
+
+class TimingPopup(Popup):
+    '''
+    Live view of perf_timing: how long redraws and other hot paths
+    take, and how fast samples arrive while recording. Stays open
+    next to the main window, it does not freeze it
+    '''
+    
+    refresh_ms = 500
+    
+    def __init__(self, title='Timings'):
+        super().__init__(title)
+        self.grab_release()
+        
+        self.refresh_job = None
+        
+        self.buildPage()
+        self.refresh()
+        
+        self.protocol('WM_DELETE_WINDOW', self.close)
+    
+    def buildPage(self):
+        self.enabled_var = tk.BooleanVar(value=perf_timing.isEnabled())
+        self.counters_var = tk.StringVar()
+        
+        main_frame = ttk.Frame(self, padding=5)
+        
+        enabled_check = ttk.Checkbutton(main_frame, text='Record timings',
+            variable=self.enabled_var,
+            command=lambda: perf_timing.enable(self.enabled_var.get()))
+        
+        columns = ('calls', 'rate', 'mean', 'p95', 'max')
+        self.timer_list = ttk.Treeview(main_frame, columns=columns, height=8,
+            selectmode='none')
+        self.timer_list.heading('#0', text='Timer')
+        self.timer_list.heading('calls', text='Calls')
+        self.timer_list.heading('rate', text='Per s')
+        self.timer_list.heading('mean', text='Mean ms')
+        self.timer_list.heading('p95', text='95% ms')
+        self.timer_list.heading('max', text='Max ms')
+        self.timer_list.column('#0', width=120)
+        for column in columns:
+            self.timer_list.column(column, width=65, anchor=tk.E)
+        
+        counters_label = ttk.Label(main_frame, textvariable=self.counters_var,
+            font=('Courier', 10), justify=tk.LEFT)
+        
+        button_frame = ttk.Frame(main_frame)
+        reset_button = ttk.Button(button_frame, text='Reset',
+            command=self.reset)
+        save_button = ttk.Button(button_frame, text='Save...',
+            command=self.save)
+        close_button = ttk.Button(button_frame, text='Close',
+            command=self.close)
+        
+        main_frame.pack(fill=tk.BOTH, expand=1)
+        
+        enabled_check.grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.timer_list.grid(row=1, column=0)
+        counters_label.grid(row=2, column=0, sticky=tk.W, pady=5)
+        
+        button_frame.grid(row=3, column=0, pady=10)
+        reset_button.pack(padx=5, side=tk.LEFT)
+        save_button.pack(padx=5, side=tk.LEFT)
+        close_button.pack(padx=5, side=tk.LEFT)
+    
+    def refresh(self):
+        '''Show the latest numbers, again every refresh_ms'''
+        
+        self.timer_list.delete(*self.timer_list.get_children())
+        for timer in perf_timing.items(perf_timing.Timer):
+            summary = timer.summary()
+            self.timer_list.insert('', tk.END, text=timer.name, values=(
+                summary['count'],
+                '{:.1f}'.format(summary['per_second']),
+                '{:.2f}'.format(summary['mean_ms']),
+                '{:.2f}'.format(summary['p95_ms']),
+                '{:.2f}'.format(summary['max_ms'])))
+        
+        lines = []
+        for counter in perf_timing.items(perf_timing.Counter):
+            lines.append('{:<16} {:8.1f} /s  {} total'.format(counter.name,
+                counter.rate(), counter.total))
+        for gauge in perf_timing.items(perf_timing.Gauge):
+            lines.append('{:<16} {:8}     {} highest'.format(gauge.name,
+                gauge.value, gauge.highest))
+        self.counters_var.set('\n'.join(lines))
+        
+        self.refresh_job = self.after(self.refresh_ms, self.refresh)
+    
+    def reset(self):
+        perf_timing.reset()
+        self.after_cancel(self.refresh_job)
+        self.refresh()
+    
+    def save(self):
+        file_name = filedialog.asksaveasfilename(parent=self,
+            defaultextension='.json', title='Save Timings',
+            confirmoverwrite=True)
+        
+        if file_name:   # Prevents error if dialog canceled
+            try:
+                perf_timing.dump(file_name)
+            except OSError as e:
+                print(e)
+                messagebox.showerror('Error', 'Unable to save timings')
+    
+    def close(self):
+        if self.refresh_job is not None:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        self.destroy()
+
+
+class ProfilerMenu():
+    '''
+    Start/Stop Profiling entry added to a menu. Runs a
+    sampling_profiler.SamplingProfiler on the Tk thread and asks
+    where to save the stacks when it is stopped
+    '''
+    
+    def __init__(self, menu, name='Servo Programmer'):
+        self.menu = menu
+        self.name = name
+        self.profiler = None
+        
+        menu.add_command(label='Start Profiling', command=self.toggle)
+        self.index = menu.index(tk.END)
+    
+    def toggle(self):
+        if self.profiler is None:
+            # Menu commands run on the Tk thread, so that is what is sampled
+            self.profiler = sampling_profiler.SamplingProfiler()
+            self.profiler.start()
+            self.menu.entryconfig(self.index, label='Stop Profiling')
+        else:
+            self.stop()
+    
+    def stop(self):
+        profiler, self.profiler = self.profiler, None
+        self.menu.entryconfig(self.index, label='Start Profiling')
+        profiler.stop()
+        
+        if not profiler.samples:
+            return
+        
+        file_name = filedialog.asksaveasfilename(
+            defaultextension='.json', title='Save Profile',
+            filetypes=[('speedscope', '*.json'),
+                       ('Collapsed stacks', '*.txt')],
+            confirmoverwrite=True)
+        
+        if file_name:   # Prevents error if dialog canceled
+            try:
+                profiler.save(file_name, self.name)
+            except OSError as e:
+                print(e)
+                messagebox.showerror('Error', 'Unable to save profile')
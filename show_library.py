@@ -0,0 +1,257 @@
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+import servo_file
+import sketch_budget
+
+from plot_overview import Envelope
+
+
+# The index is laid out like a .servo file: a JSON header with an
+# entry for each show, then the thumbnails of every show as bytes.
+# A thumbnail is the lowest then the highest value of each column,
+# for every servo
+INDEX_NAME = '.servo_library'
+INDEX_MAGIC = b'SRVL'
+INDEX_VERSION = 3
+THUMBNAIL_COLUMNS = 64
+
+
+class ShowLibrary():
+    '''
+    Every .servo file in a folder, with what the load dialog needs to
+    list, filter and check them kept in an index file. Only shows
+    whose file changed since the index was written are read again
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_file = os.path.join(directory, INDEX_NAME)
+
+        self.entries = {}      # file name -> metadata of the show
+        self.thumbnails = {}   # file name -> (servos x 2 x columns) uint8 array
+
+        self.readIndex()
+
+    def readIndex(self):
+        '''Entries from the index file, thumbnails are views of the mapped file'''
+
+        self.entries = {}
+        self.thumbnails = {}
+
+        try:
+            with open(self.index_file, 'rb') as reader:
+                mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+            header, start = servo_file.parseHeader(mapped, self.index_file,
+                INDEX_MAGIC)
+        except (OSError, ValueError):
+            # No index yet, or one that cannot be used, is built again
+            return
+
+        if header.get('version') != INDEX_VERSION:
+            return
+
+        for name, entry in header['entries'].items():
+            shape = (len(entry['names']), 2, entry['columns'])
+            self.entries[name] = entry
+            self.thumbnails[name] = np.frombuffer(mapped, dtype=np.uint8,
+                count=int(np.prod(shape)),
+                offset=start+entry['offset']).reshape(shape)
+
+    def writeIndex(self):
+        entries = {}
+        blocks = []
+        offset = 0
+        for name, entry in self.entries.items():
+            block = self.thumbnails[name].tobytes()
+            entries[name] = dict(entry, offset=offset)
+            blocks.append(block)
+            offset += len(block)
+
+        header = json.dumps({'version': INDEX_VERSION,
+                             'entries': entries}).encode('utf-8')
+
+        # Views of the old index have to go before it is replaced
+        self.thumbnails = {}
+
+        temp_file = self.index_file + '.tmp'
+        try:
+            with open(temp_file, 'wb') as writer:
+                writer.write(servo_file.PREAMBLE.pack(INDEX_MAGIC,
+                    servo_file.VERSION, len(header)))
+                writer.write(header)
+                writer.writelines(blocks)
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            # Read-only folders still list, they are scanned every time
+            print(e)
+            self.thumbnails = {name: self.makeThumbnail(block, entry)
+                               for (name, entry), block
+                               in zip(entries.items(), blocks)}
+            return
+
+        self.readIndex()
+
+    @staticmethod
+    def makeThumbnail(block, entry):
+        shape = (len(entry['names']), 2, entry['columns'])
+        return np.frombuffer(block, dtype=np.uint8).reshape(shape)
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the folder, True if anything
+        changed. Unchanged files are not opened
+        '''
+
+        try:
+            names = [name for name in os.listdir(self.directory)
+                     if name.endswith('.servo')]
+        except OSError as e:
+            print(e)
+            names = []
+
+        changed = False
+        for name in set(self.entries) - set(names):
+            del self.entries[name]
+            del self.thumbnails[name]
+            changed = True
+
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+
+            entry = self.entries.get(name)
+            if (entry and entry['mtime'] == stat.st_mtime_ns
+                    and entry['size'] == stat.st_size):
+                continue
+
+            self.entries[name], self.thumbnails[name] = self.scan(name, stat)
+            changed = True
+
+        if changed:
+            self.writeIndex()
+
+        return changed
+
+    def scan(self, name, stat):
+        '''Entry and thumbnail of one show, read from its file'''
+
+        entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+        try:
+            # Old files are pickled, unpickling runs whatever code is in
+            # them, so they are only loaded when chosen
+            if servo_file.isLegacy(self.path(name)):
+                entry.update(names=[], columns=0, legacy=True)
+                return entry, np.empty((0, 2, 0), dtype=np.uint8)
+
+            header, channels = self.readShow(name)
+        except Exception as e:
+            # Listed with the reason it cannot be loaded
+            entry.update(names=[], columns=0, error=str(e))
+            return entry, np.empty((0, 2, 0), dtype=np.uint8)
+
+        entry.update(
+            names=[servo['name'] for servo in header['servos']],
+            pins=[servo['pin'] for servo in header['servos']],
+            seconds=header['seconds'],
+            length=max((len(values) for values in channels), default=0),
+            button=header['button_#'],
+            output_type=header['output_type'],
+            encoding=header['encoding'],
+            millis=header.get('millis', 15))
+
+        envelopes = []
+        for values in channels:
+            envelope = Envelope(THUMBNAIL_COLUMNS)
+            envelope.update(values)
+            envelopes.append(envelope)
+
+        entry['columns'] = max((len(env.lo) for env in envelopes), default=0)
+        thumbnail = np.zeros((len(envelopes), 2, entry['columns']), dtype=np.uint8)
+        for index, envelope in enumerate(envelopes):
+            envelope.resize(entry['columns'])
+            thumbnail[index] = (envelope.lo, envelope.hi)
+
+        return entry, thumbnail
+
+    def filter(self, text='', output_type=None):
+        '''File names of shows whose file or servo names contain text'''
+
+        text = text.lower()
+        found = []
+        for name, entry in self.entries.items():
+            if output_type and entry.get('output_type') != output_type:
+                continue
+            if text and not any(text in each.lower()
+                                for each in [name] + entry['names']):
+                continue
+            found.append(name)
+
+        return sorted(found, key=str.lower)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def readShow(self, name):
+        '''Header and keyframes of every servo, never of old dill files'''
+
+        return servo_file.openChannels(self.path(name))
+
+    def compressedBytes(self, name):
+        '''
+        Bytes of each servo's array once compressed. Slow to work out,
+        so only done for shows that are checked. Saved with the entry
+        the next time the index is written
+        '''
+
+        entry = self.entries[name]
+        if 'compressed_bytes' not in entry:
+            header, channels = self.readShow(name)
+            entry['compressed_bytes'] = [sketch_budget.arrayBytes(values,
+                'compressed', entry['millis']) for values in channels]
+
+        return entry['compressed_bytes']
+
+    def check(self, name, budget, num_servos, max_servos, seconds):
+        '''
+        Messages for each reason loading the show next to num_servos
+        servos of seconds would fail, like loadServos() checks after
+        loading. Sizes are estimated when routines have to be padded
+        '''
+
+        entry = self.entries[name]
+        if 'error' in entry:
+            return ['Cannot read file: {}'.format(entry['error'])]
+        if entry.get('legacy'):
+            # Nothing is known until it is loaded, loadServos() checks then
+            return []
+
+        messages = []
+        if num_servos + len(entry['names']) > max_servos:
+            messages.append('Loading will exceed max number of servos ({})'
+                .format(max_servos))
+
+        # Both are padded to the longer of the two
+        new_seconds = max(seconds, entry['seconds'])
+        num_nodes = new_seconds*2 + 1
+        estimate = lambda: sketch_budget.arrayEstimate(num_nodes,
+            budget.encoding, budget.millis)
+
+        if new_seconds == seconds:
+            sizes = budget.arraySizes()
+        else:
+            sizes = [estimate() for i in range(num_servos)]
+
+        if new_seconds == entry['seconds'] and budget.encoding == 'compressed':
+            sizes += self.compressedBytes(name)
+        else:
+            sizes += [estimate() for servo in entry['names']]
+
+        return messages + budget.problems(sizes)
@@ -0,0 +1,202 @@
+
+from collections import namedtuple
+
+import routine_compression
+import sketch_output
+
+
+Board = namedtuple('Board', ['name', 'flash', 'sram'])
+
+# Flash is what is left for the sketch after the bootloader
+BOARDS = {
+    'Uno': Board('Arduino Uno', flash=32256, sram=2048),
+    'Nano': Board('Arduino Nano', flash=30720, sram=2048),
+    'Pro Mini': Board('Arduino Pro Mini', flash=30720, sram=2048),
+    'Leonardo': Board('Arduino Leonardo', flash=28672, sram=2560),
+    'Micro': Board('Arduino Micro', flash=28672, sram=2560),
+    'Mega 2560': Board('Arduino Mega 2560', flash=253952, sram=8192),
+}
+
+# pgm_read_byte() only reaches the first 64K of flash,
+# and avr-gcc limits a single array to 32767 bytes
+NEAR_FLASH = 65536 - 256
+MAX_ARRAY = 32767
+
+# Approximate flash used by the template code and its libraries
+CODE_FLASH = {'i2c': 5800, 'pins': 4600}
+DECODER_FLASH = {'full': 0, 'compressed': 300, 'keyframes': 450}
+
+# Approximate SRAM for Serial, Wire/Servo libraries and the stack
+BASE_SRAM = {'i2c': 420, 'pins': 300}
+STACK_SRAM = 200
+# Globals the template declares for each servo
+SERVO_SRAM = {'i2c': 6, 'pins': 8}
+DECODER_SRAM = {'full': 0, 'compressed': 8, 'keyframes': 0}
+BUTTON_SRAM = 21
+
+
+def arrayEstimate(num_nodes, encoding='full', millis=15):
+    '''
+    PROGMEM bytes of a value array of num_nodes keyframes. Exact except
+    for 'compressed', where it is the usual one run per keyframe
+    '''
+
+    if num_nodes == 0:
+        return 0
+    elif encoding == 'full':
+        return (num_nodes-1)*int(500/millis) + 1
+    elif encoding == 'keyframes':
+        return num_nodes
+    elif encoding == 'compressed':
+        return 2*(num_nodes-1) + 1
+
+    raise ValueError('Unknown encoding: {}'.format(encoding))
+
+
+def arrayBytes(keyframes, encoding='full', millis=15):
+    '''Exact PROGMEM bytes of one servo's value array'''
+
+    if encoding == 'compressed' and len(keyframes):
+        tweens = sketch_output.inBetweeners(keyframes, millis)[0]
+        return len(routine_compression.compressRoutine(tweens))
+
+    return arrayEstimate(len(keyframes), encoding, millis)
+
+
+class SketchBudget():
+    '''
+    Flash and SRAM the output sketch would need on the chosen board.
+    Each servo's array size is cached and only recomputed after
+    that servo is marked dirty
+    '''
+
+    def __init__(self, board='Uno', output_type='i2c', encoding='full',
+                 millis=15):
+        self.board = BOARDS[board]
+        self.output_type = output_type
+        self.encoding = encoding
+        self.millis = millis
+        self.button = False
+
+        self.routines = {}       # key -> keyframes of that servo
+        self.array_bytes = {}    # key -> cached bytes, None when dirty
+
+    def configure(self, board=None, output_type=None, encoding=None,
+                  button=None):
+        '''Change sketch options, array sizes only depend on encoding'''
+
+        if board is not None:
+            self.board = BOARDS[board]
+        if output_type is not None:
+            self.output_type = output_type
+        if button is not None:
+            self.button = button
+        if encoding is not None and encoding != self.encoding:
+            self.encoding = encoding
+            for key in self.array_bytes:
+                self.array_bytes[key] = None
+
+    def setRoutine(self, key, keyframes):
+        self.routines[key] = keyframes
+        self.array_bytes[key] = None
+
+    def removeRoutine(self, key):
+        self.routines.pop(key, None)
+        self.array_bytes.pop(key, None)
+
+    def markDirty(self, key):
+        if key in self.array_bytes:
+            self.array_bytes[key] = None
+
+    def arraySizes(self):
+        '''Bytes of every servo's array, recomputing only dirty ones'''
+
+        for key, size in self.array_bytes.items():
+            if size is None:
+                self.array_bytes[key] = arrayBytes(self.routines[key],
+                    self.encoding, self.millis)
+
+        return list(self.array_bytes.values())
+
+    def codeBytes(self):
+        return CODE_FLASH[self.output_type] + DECODER_FLASH[self.encoding]
+
+    def sramBytes(self, num_servos):
+        '''Approximate SRAM used by the sketch's globals and the stack'''
+
+        per_servo = SERVO_SRAM[self.output_type] + DECODER_SRAM[self.encoding]
+
+        return (BASE_SRAM[self.output_type] + STACK_SRAM
+                + per_servo*num_servos
+                + (BUTTON_SRAM if self.button else 0))
+
+    def dataLimit(self):
+        '''Most bytes of value arrays the board can hold and read'''
+
+        return min(self.board.flash - self.codeBytes(), NEAR_FLASH)
+
+    def check(self, extra=(), routines=None):
+        '''
+        Messages for each limit the sketch would break, empty if it fits.
+        extra are keyframes of servos about to be added, routines
+        replaces every cached servo, e.g. when time is added to all
+        '''
+
+        if routines is None:
+            sizes = self.arraySizes()
+        else:
+            sizes = [arrayBytes(keys, self.encoding, self.millis)
+                     for keys in routines]
+        sizes += [arrayBytes(keys, self.encoding, self.millis)
+                  for keys in extra]
+
+        return self.problems(sizes)
+
+    def checkLength(self, num_servos, num_nodes):
+        '''check() by length alone, for num_servos routines of num_nodes keyframes'''
+
+        size = arrayEstimate(num_nodes, self.encoding, self.millis)
+        return self.problems([size] * num_servos)
+
+    def problems(self, sizes):
+        messages = []
+
+        if sizes and max(sizes) > MAX_ARRAY:
+            messages.append('A routine needs {} bytes, the limit for one '
+                'array is {}'.format(max(sizes), MAX_ARRAY))
+
+        if sum(sizes) > self.dataLimit():
+            messages.append('Routines need {} bytes of flash, {} has room '
+                'for {}'.format(sum(sizes), self.board.name, self.dataLimit()))
+
+        sram = self.sramBytes(len(sizes))
+        if sram > self.board.sram:
+            messages.append('Sketch needs about {} bytes of SRAM, {} has '
+                '{}'.format(sram, self.board.name, self.board.sram))
+
+        return messages
+
+    def maxSeconds(self, num_servos):
+        '''Longest routine that still fits for num_servos servos'''
+
+        num_servos = max(num_servos, 1)
+        seconds = 0
+        step = 1 << 16
+
+        # Binary search on whole seconds, 2 keyframes per second
+        while step:
+            if not self.checkLength(num_servos, (seconds+step)*2 + 1):
+                seconds += step
+            step >>= 1
+
+        return seconds
+
+    def summary(self):
+        '''Short text of flash and SRAM use for the settings page'''
+
+        sizes = self.arraySizes()
+        flash = self.codeBytes() + sum(sizes)
+
+        return 'Flash: {} / {} bytes\nSRAM: ~{} / {} bytes'.format(
+            flash, self.board.flash,
+            self.sramBytes(len(sizes)), self.board.sram)
@@ -0,0 +1,211 @@
+
+import os
+
+import numpy as np
+
+import routine_compression
+
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_FILES = {'i2c': 'i2c_template.txt', 'pins': 'pin_template.txt'}
+ENCODINGS = ('full', 'compressed', 'keyframes')   # How value arrays are stored in PROGMEM
+# Parsed templates are kept here between sessions
+CACHE_DIR = os.path.join(TEMPLATE_DIR, '.template_cache')
+
+_template_env = None    # Shared by every export, see templateEnvironment()
+_cache_error = None     # Why templates could not be cached, until reported
+
+
+# Pre-formatted text for every byte value, inside a row and ending a row
+_CELLS = ['{}, '.format(num).rjust(5) for num in range(256)]
+_ROW_ENDS = ['{},\n'.format(num).rjust(5) for num in range(256)]
+
+
+def inBetweeners(routines, millis):
+    '''
+    Divide raw datapoints of every routine linearly by millis interval
+    for smooth servo movement. Returns a (servos x samples) uint8 array
+    '''
+
+    keys = np.asarray(routines, dtype=np.float64)
+    if keys.ndim == 1:
+        keys = keys[np.newaxis, :]
+
+    num_servos, num_nodes = keys.shape
+    divisor = int(500/millis)
+
+    if num_nodes == 0:
+        return np.empty((num_servos, 0), dtype=np.uint8)
+
+    tweens = np.empty((num_servos, (num_nodes-1)*divisor + 1), dtype=np.uint8)
+
+    # Same arithmetic as value + (step*i), rounded half to even like round()
+    starts = keys[:, :-1, np.newaxis]
+    steps = (keys[:, 1:, np.newaxis] - starts) / divisor
+    ramps = np.round(starts + steps*np.arange(divisor))
+
+    tweens[:, :-1] = ramps.reshape(num_servos, -1)
+    # Last node of each routine is held as-is
+    tweens[:, -1] = keys[:, -1]
+
+    return tweens
+
+
+def encodeRoutines(routines, millis, encoding='full'):
+    '''
+    Value arrays to store in PROGMEM for the chosen encoding, and the
+    number of samples the routine plays. 'compressed' and 'keyframes'
+    arrays are decoded by the sketch while it runs
+    '''
+
+    if encoding == 'keyframes':
+        keyframes = np.asarray(routines, dtype=np.uint8)
+        steps = int(500/millis)
+
+        # Only odd steps never land exactly halfway between keyframes
+        if steps % 2 == 0:
+            raise ValueError('Keyframes need an odd number of steps '
+                'between them, not {}'.format(steps))
+
+        return keyframes, (keyframes.shape[1]-1)*steps + 1
+
+    tweens = inBetweeners(routines, millis)
+
+    if encoding == 'full':
+        return tweens, tweens.shape[1]
+    elif encoding == 'compressed':
+        return ([routine_compression.compressRoutine(arr) for arr in tweens],
+                tweens.shape[1])
+
+    raise ValueError('Unknown encoding: {}'.format(encoding))
+
+
+def prettyRows(arr, per_row=10, rows_per_block=100):
+    '''
+    Yield the plot values array in human readable form,
+    one row of text at a time
+    '''
+
+    values = np.asarray(arr)
+    block_size = per_row * rows_per_block
+
+    # Only one block of values is held as python ints at a time
+    for block_start in range(0, len(values), block_size):
+        block = values[block_start:block_start+block_size].tolist()
+
+        for start in range(0, len(block), per_row):
+            row = block[start:start+per_row]
+
+            if len(row) == per_row:
+                yield ''.join([_CELLS[num] for num in row[:-1]]) + _ROW_ENDS[row[-1]]
+            else:
+                # Last partial row has no line break
+                yield ''.join([_CELLS[num] for num in row])
+
+
+def writePretty(arr, out_file, per_row=10):
+    '''Write the plot values array straight into a file-like object'''
+
+    out_file.writelines(prettyRows(arr, per_row))
+
+
+def templateEnvironment(cache_dir=None):
+    '''
+    Jinja2 environment shared by all exports, created on first use.
+    Compiled templates stay in its cache for the rest of the session
+    '''
+
+    global _template_env, _cache_error
+
+    # Only exporting needs jinja2, it is imported on first use
+    import jinja2
+
+    if _template_env is None:
+        _template_env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(searchpath=TEMPLATE_DIR),
+            auto_reload=False)
+        _template_env.globals.update(zip=zip)
+
+    if cache_dir and _template_env.bytecode_cache is None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            # Templates are parsed every session instead, see cacheError()
+            _cache_error = e
+        else:
+            _template_env.bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+
+    return _template_env
+
+
+def getTemplate(output_type):
+    '''Compiled sketch template for 'i2c' or 'pins' output'''
+
+    try:
+        file_name = TEMPLATE_FILES[output_type]
+    except KeyError:
+        raise ValueError('Unknown output type: {}'.format(output_type))
+
+    # The first export of a session fills the cache or loads from it
+    return templateEnvironment(CACHE_DIR).get_template(file_name)
+
+
+def cacheError():
+    '''
+    OSError that stopped the template cache being made, None if there
+    was none. Given once, so it is only reported once
+    '''
+
+    global _cache_error
+
+    error, _cache_error = _cache_error, None
+    return error
+
+
+def precompileTemplates(cache_dir=CACHE_DIR):
+    '''
+    Compile every sketch template ahead of time, storing the bytecode
+    in cache_dir so later sessions skip parsing
+    '''
+
+    env = templateEnvironment(cache_dir)
+    return [env.get_template(file_name) for file_name in TEMPLATE_FILES.values()]
+
+
+def templateDict(names, pin_nums, routines, button, output_type,
+                 encoding='full', millis=15):
+    '''
+    Keys for the sketch templates. button is the start button's pin,
+    or 'None' to run the routine straight away
+    '''
+
+    # All servos are interpolated together in one batch,
+    # keyframes are interpolated by the sketch instead
+    value_arrays, routine_length = encodeRoutines(routines, millis, encoding)
+
+    return {
+        'list_of_names' : names,
+        'interval' : millis,
+        # Template pulls the text of each array row by row, as it is written
+        'tweenerArrays': (prettyRows(arr) for arr in value_arrays),
+        'button' : button,
+        'pinNames' : ['{}_PIN'.format(name) for name in names],
+        'pinNums' : pin_nums,
+        'outputType' : output_type,
+        'encoding' : encoding,
+        'routine_length' : routine_length,
+        'keyframe_steps' : int(500/millis)}
+
+
+def writeSketch(file_name, output_type, template_dict, buffer_size=65536):
+    '''
+    Render the sketch template chunk by chunk into file_name,
+    the whole sketch text is never held in memory at once
+    '''
+
+    stream = getTemplate(output_type).stream(template_dict)
+    # Group small template chunks into fewer writes
+    stream.enable_buffering(size=20)
+
+    with open(file_name, 'w', buffering=buffer_size) as out_file:
+        stream.dump(out_file)
@@ -0,0 +1,6 @@
+
+import os
+import sys
+
+# The app is a folder of modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+
+import numpy as np
+import pytest
+
+import routine_compression
+import sketch_output
+
+from routine_compression import MAX_RUN, compressRoutine, expandRoutine
+
+
+def roundTrip(samples):
+    samples = np.asarray(samples, dtype=np.uint8)
+    encoded = compressRoutine(samples)
+
+    assert encoded.dtype == np.uint8
+    assert np.array_equal(expandRoutine(encoded), samples)
+    assert routine_compression.routineLength(encoded) == len(samples)
+
+    return encoded
+
+
+@pytest.mark.parametrize('millis', [10, 15, 20, 100])
+@pytest.mark.parametrize('seed', range(5))
+def test_inbetweeners_round_trip(millis, seed):
+    rng = np.random.RandomState(seed)
+    keyframes = rng.randint(0, 180, size=(3, 41))
+
+    for tweens in sketch_output.inBetweeners(keyframes, millis):
+        encoded = roundTrip(tweens)
+        assert len(encoded) < len(tweens)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_round_trip(seed):
+    rng = np.random.RandomState(seed)
+    roundTrip(rng.randint(0, 256, size=1000))
+
+
+def test_empty():
+    assert len(roundTrip([])) == 0
+
+
+def test_single_value():
+    assert roundTrip([42]).tolist() == [42]
+
+
+@pytest.mark.parametrize('length', [MAX_RUN, MAX_RUN + 1, MAX_RUN + 2,
+                                    3*MAX_RUN + 7])
+def test_runs_longer_than_max_run(length):
+    # Held still, then one long straight ramp
+    roundTrip([90] * length)
+    roundTrip(np.linspace(0, 179, length).round())
+
+
+@pytest.mark.parametrize('millis', [15, 20, 71, 100])
+@pytest.mark.parametrize('seed', range(5))
+def test_keyframes_match_inbetweeners(millis, seed):
+    steps = int(500/millis)
+    assert steps % 2 == 1
+
+    rng = np.random.RandomState(seed)
+    ys = rng.randint(0, 180, size=61).astype(np.uint8)
+
+    assert np.array_equal(routine_compression.interpolateKeyframes(ys, steps),
+                          sketch_output.inBetweeners([ys], millis)[0])
+
+
+@pytest.mark.parametrize('millis', [10, 25, 50])
+def test_keyframes_need_odd_steps(millis):
+    assert int(500/millis) % 2 == 0
+
+    with pytest.raises(ValueError):
+        sketch_output.encodeRoutines([[0, 90, 179]], millis, 'keyframes')
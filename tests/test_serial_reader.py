@@ -0,0 +1,98 @@
+import pytest
+
+from serial_reader import HEADER, MAX_SERVOS, SYNC_BYTE, VERSION, FrameParser, crc8
+
+
+def makeFrame(sequence, millis, angles, version=VERSION):
+    frame = HEADER.pack(SYNC_BYTE, version, sequence, millis, len(angles)) + bytes(angles)
+    # The CRC does not cover the sync byte
+    return frame + bytes([crc8(frame[1:])])
+
+
+def bitwiseCrc8(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for bit in range(8):
+            crc = ((crc << 1) ^ 0x07 if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+def test_crc8():
+    # Check value of CRC-8/SMBUS
+    assert crc8(b'123456789') == 0xF4
+    assert crc8(b'') == 0
+
+    data = bytes(range(256))
+    for start in range(0, 256, 17):
+        assert crc8(data[start:]) == bitwiseCrc8(data[start:])
+
+
+def test_frames():
+    parser = FrameParser()
+    data = makeFrame(1, 20, [90, 45]) + makeFrame(2, 40, [91, 46])
+
+    assert parser.feed(data) == [(1, 20, bytes([90, 45])), (2, 40, bytes([91, 46]))]
+    assert parser.corrupt == 0
+    assert not parser.buffer
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64])
+def test_split_across_reads(size):
+    frames = [makeFrame(sequence, sequence*20, [sequence, 179 - sequence, 90])
+              for sequence in range(20)]
+    data = b''.join(frames)
+
+    parser = FrameParser()
+    parsed = []
+    for start in range(0, len(data), size):
+        parsed += parser.feed(data[start:start+size])
+
+    assert [sequence for sequence, millis, angles in parsed] == list(range(20))
+    assert parsed[5] == (5, 100, bytes([5, 174, 90]))
+    assert parser.corrupt == 0
+
+
+def test_partial_frame_is_kept():
+    frame = makeFrame(7, 140, [10, 20, 30])
+    parser = FrameParser()
+
+    assert parser.feed(frame[:-1]) == []
+    assert parser.feed(frame[-1:]) == [(7, 140, bytes([10, 20, 30]))]
+
+
+def test_resync_on_garbage():
+    # Noise, including sync bytes that do not start a frame
+    garbage = bytes([0x00, SYNC_BYTE, 0x13, 0x37, SYNC_BYTE, SYNC_BYTE, 0xFF, 0x42])
+    parser = FrameParser()
+
+    frames = parser.feed(garbage + makeFrame(1, 20, [90]) + garbage
+                         + makeFrame(2, 40, [91]) + garbage[:3])
+    frames += parser.feed(makeFrame(3, 60, [92]))
+
+    assert [sequence for sequence, millis, angles in frames] == [1, 2, 3]
+    assert parser.corrupt > 0
+
+
+def test_bad_crc_is_dropped():
+    good = makeFrame(1, 20, [90, 45])
+    bad = bytearray(makeFrame(2, 40, [91, 46]))
+    bad[-2] ^= 0x01
+    parser = FrameParser()
+
+    frames = parser.feed(good + bytes(bad) + makeFrame(3, 60, [92, 47]))
+
+    assert [sequence for sequence, millis, angles in frames] == [1, 3]
+    assert parser.corrupt == 1
+
+
+@pytest.mark.parametrize('frame', [
+    makeFrame(1, 20, [90], version=VERSION + 1),
+    makeFrame(1, 20, []),
+    makeFrame(1, 20, [90] * (MAX_SERVOS + 1)),
+])
+def test_bad_header_is_dropped(frame):
+    parser = FrameParser()
+
+    assert parser.feed(frame + makeFrame(2, 40, [91])) == [(2, 40, bytes([91]))]
+    assert parser.corrupt >= 1
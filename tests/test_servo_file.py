@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import routine_model
+import servo_file
+
+
+def makeShow():
+    routines = [routine_model.Routine('arm', [10, 90, 170, 45], 3, 5, 175),
+                routine_model.Routine('head', [0, 179, 60, 60], 9),
+                routine_model.Routine('empty', [], 12)]
+    return routine_model.Show(routines, 7, 'pins', 'keyframes', 20)
+
+
+def assertSameShow(show, loaded):
+    assert len(loaded.routines) == len(show.routines)
+    for routine, other in zip(show.routines, loaded.routines):
+        assert other.name == routine.name
+        assert other.pin == routine.pin
+        assert (other.lower_limit, other.upper_limit) == (
+            routine.lower_limit, routine.upper_limit)
+        np.testing.assert_array_equal(other.ys, routine.ys)
+
+    assert loaded.button == show.button
+    assert loaded.output_type == show.output_type
+    assert loaded.encoding == show.encoding
+
+
+def test_round_trip(tmp_path):
+    file_name = str(tmp_path / 'show.servo')
+    show = makeShow()
+    servo_file.save(file_name, show)
+
+    assert not servo_file.isLegacy(file_name)
+    loaded = servo_file.load(file_name)
+    assertSameShow(show, loaded)
+    assert loaded.millis == 20
+
+
+def test_header_without_keyframes(tmp_path):
+    file_name = str(tmp_path / 'show.servo')
+    servo_file.save(file_name, makeShow(), extra={'note': 'kept'})
+
+    header = servo_file.readHeader(file_name)
+    assert [servo['name'] for servo in header['servos']] == ['arm', 'head', 'empty']
+    assert [servo['length'] for servo in header['servos']] == [4, 4, 0]
+    assert header['note'] == 'kept'
+
+
+def test_legacy_file(tmp_path):
+    dill = pytest.importorskip('dill')
+
+    file_name = str(tmp_path / 'old.servo')
+    show = makeShow()
+    with open(file_name, 'wb') as writer:
+        dill.dump(show.toSettings(), writer)
+
+    assert servo_file.isLegacy(file_name)
+    loaded = servo_file.load(file_name)
+    assertSameShow(show, loaded)
+    # Old files did not save the interval
+    assert loaded.millis == routine_model.Show().millis
+    assert servo_file.readHeader(file_name)['servos'][0]['name'] == 'arm'
+
+
+def test_legacy_file_without_limits_or_encoding(tmp_path):
+    dill = pytest.importorskip('dill')
+
+    file_name = str(tmp_path / 'old.servo')
+    with open(file_name, 'wb') as writer:
+        dill.dump({'seconds': 1, 'plot_pages': [['arm', 3, [10, 20, 30]]],
+                   'button_#': 'None', 'output_type': 'i2c'}, writer)
+
+    loaded = servo_file.load(file_name)
+    routine = loaded.routines[0]
+    assert (routine.lower_limit, routine.upper_limit) == (0, 179)
+    assert loaded.encoding == 'full'
+
+
+def test_newer_version(tmp_path):
+    file_name = str(tmp_path / 'new.servo')
+    servo_file.save(file_name, makeShow())
+    with open(file_name, 'r+b') as writer:
+        writer.write(servo_file.PREAMBLE.pack(servo_file.MAGIC,
+            servo_file.VERSION + 1, 0)[:6])
+
+    with pytest.raises(ValueError, match='newer version'):
+        servo_file.load(file_name)
+
+
+@pytest.mark.parametrize('cut', [
+    servo_file.PREAMBLE.size + 5,   # In the header
+    -1,                             # In the keyframes
+])
+def test_cut_short(tmp_path, cut):
+    file_name = str(tmp_path / 'cut.servo')
+    servo_file.save(file_name, makeShow())
+    with open(file_name, 'rb') as reader:
+        data = reader.read()
+    with open(file_name, 'wb') as writer:
+        writer.write(data[:cut])
+
+    with pytest.raises(ValueError, match='cut short'):
+        servo_file.load(file_name)
@@ -0,0 +1,62 @@
+import os
+
+import routine_model
+import servo_file
+
+from show_library import ShowLibrary
+
+
+def makeShow():
+    return routine_model.Show([routine_model.Routine('arm', [10, 90, 170], 3)],
+                              'None', 'pins', 'full', 15)
+
+
+def refreshed(tmp_path):
+    library = ShowLibrary(str(tmp_path))
+    library.refresh()
+    return library
+
+
+def test_show_is_listed(tmp_path):
+    servo_file.save(str(tmp_path / 'wave.servo'), makeShow())
+
+    entry = refreshed(tmp_path).entries['wave.servo']
+    assert entry['names'] == ['arm']
+    assert entry['pins'] == [3]
+    assert 'error' not in entry and 'legacy' not in entry
+
+
+def test_legacy_file_is_not_loaded(tmp_path):
+    # Any file that does not start with the magic, it is never unpickled
+    (tmp_path / 'old.servo').write_bytes(b'\x80\x03}q\x00.')
+
+    entry = refreshed(tmp_path).entries['old.servo']
+    assert entry['legacy']
+    assert 'error' not in entry
+
+
+def test_empty_file_is_unreadable(tmp_path):
+    (tmp_path / 'empty.servo').write_bytes(b'')
+    (tmp_path / 'short.servo').write_bytes(b'SR')
+
+    library = refreshed(tmp_path)
+    for name in ('empty.servo', 'short.servo'):
+        assert 'error' in library.entries[name]
+        assert 'legacy' not in library.entries[name]
+
+
+def test_folder_is_unreadable(tmp_path):
+    os.mkdir(str(tmp_path / 'folder.servo'))
+
+    entry = refreshed(tmp_path).entries['folder.servo']
+    assert 'error' in entry
+
+
+def test_index_is_reused(tmp_path):
+    servo_file.save(str(tmp_path / 'wave.servo'), makeShow())
+    (tmp_path / 'empty.servo').write_bytes(b'')
+    refreshed(tmp_path)
+
+    library = ShowLibrary(str(tmp_path))
+    assert set(library.entries) == {'wave.servo', 'empty.servo'}
+    assert not library.refresh()
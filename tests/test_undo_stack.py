@@ -0,0 +1,268 @@
+
+import numpy as np
+
+import routine_model
+import undo_stack
+
+from undo_stack import Action, UndoStack
+
+
+def makeRoutine(values=(10, 20, 30, 40, 50)):
+    return routine_model.Routine('servo', list(values))
+
+
+def watched(routine, **limits):
+    stack = UndoStack(**limits)
+    stack.watch(routine)
+    return stack
+
+
+class Pages():
+    '''Stands in for servo_out's add and delete servo Actions'''
+
+    def __init__(self, stack):
+        self.stack = stack
+        self.shown = []
+        self.destroyed = []
+
+    def add(self, page):
+        self.shown.append(page)
+        self.stack.record(Action(
+            undo=lambda: self.shown.remove(page),
+            redo=lambda: self.shown.append(page),
+            discard=lambda undone: undone and self.destroy(page)))
+
+    def delete(self, page):
+        self.shown.remove(page)
+        self.stack.record(Action(
+            undo=lambda: self.shown.append(page),
+            redo=lambda: self.shown.remove(page),
+            discard=lambda undone: not undone and self.destroy(page)))
+
+    def destroy(self, page):
+        assert page not in self.shown
+        assert page not in self.destroyed
+        self.destroyed.append(page)
+
+
+def test_diff_undo_redo():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    routine.set(1, 99)
+    routine.splice(3, 5, [1, 2, 3])
+    routine.delete(0, 1)
+    states = [[10, 20, 30, 40, 50], [10, 99, 30, 40, 50],
+              [10, 99, 30, 1, 2, 3], [99, 30, 1, 2, 3]]
+    assert routine.ys.tolist() == states[-1]
+
+    for state in reversed(states[:-1]):
+        assert stack.undo() == {routine}
+        assert routine.ys.tolist() == state
+    assert not stack.canUndo()
+    assert stack.undo() == set()
+
+    for state in states[1:]:
+        stack.redo()
+        assert routine.ys.tolist() == state
+    assert not stack.canRedo()
+
+
+def test_undo_is_not_recorded():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    routine.set(0, 1)
+    stack.undo()
+    assert not stack.canUndo()
+    assert stack.canRedo()
+
+
+def test_new_edit_clears_redo():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    routine.set(0, 1)
+    stack.undo()
+    routine.set(1, 2)
+    assert not stack.canRedo()
+
+
+def test_drag_is_one_step():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    stack.begin()
+    for value in range(100, 120):
+        routine.set(2, value)
+    stack.end()
+
+    step, = stack.undo_steps
+    # Moving the same node again only keeps the first old and last new
+    diff, = step
+    assert diff.old.tolist() == [30]
+    assert diff.new.tolist() == [119]
+
+    stack.undo()
+    assert routine.ys.tolist() == [10, 20, 30, 40, 50]
+    stack.redo()
+    assert routine.ys[2] == 119
+
+
+def test_follows():
+    routine = makeRoutine()
+    first = undo_stack.Diff(routine, 2, np.array([30]), np.array([31]))
+
+    assert undo_stack.Diff(routine, 2, np.array([31]), np.array([32])).follows(first)
+    assert not undo_stack.Diff(routine, 3, np.array([40]), np.array([41])).follows(first)
+    assert not undo_stack.Diff(routine, 2, np.array([31]), np.array([1, 2])).follows(first)
+    assert not undo_stack.Diff(makeRoutine(), 2, np.array([31]),
+                               np.array([32])).follows(first)
+
+
+def test_nested_begin_end():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    stack.begin()
+    routine.set(0, 1)
+    stack.begin()
+    routine.set(4, 5)
+    stack.end()
+    # Inner end() does not finish the step
+    assert not stack.canUndo()
+    routine.append([60])
+    stack.end()
+
+    assert len(stack.undo_steps) == 1
+    stack.undo()
+    assert routine.ys.tolist() == [10, 20, 30, 40, 50]
+
+    # Unmatched end() is ignored, empty groups are not steps
+    stack.end()
+    stack.begin()
+    stack.end()
+    assert not stack.canUndo()
+
+
+def test_trim_max_steps():
+    routine = makeRoutine()
+    stack = watched(routine, max_steps=3)
+
+    for value in range(10):
+        routine.set(0, value)
+
+    assert len(stack.undo_steps) == 3
+    while stack.canUndo():
+        stack.undo()
+    assert routine.ys[0] == 6
+
+
+def test_trim_max_bytes_keeps_newest():
+    routine = makeRoutine([0]*1000)
+    stack = watched(routine, max_bytes=1500)
+
+    for value in range(5):
+        routine.splice(0, 1000, [value]*1000)
+
+    # One step is over the limit by itself, it is still kept
+    assert len(stack.undo_steps) == 1
+    assert stack.size == undo_stack.stepSize(stack.undo_steps[0])
+
+
+def test_size_counts_both_lists():
+    routine = makeRoutine()
+    stack = watched(routine)
+
+    routine.splice(0, 2, [1, 2, 3])
+    size = stack.size
+    stack.undo()
+    assert stack.size == size
+    routine.set(0, 1)
+    assert stack.size == undo_stack.stepSize(stack.undo_steps[0])
+
+
+def test_kept_pages_do_not_push_out_edits():
+    routine = makeRoutine()
+    stack = watched(routine, max_kept=10)
+    pages = Pages(stack)
+
+    for value in range(10):
+        routine.set(0, value)
+    for page in range(4):
+        pages.add(page)
+
+    assert len(stack.undo_steps) == 14
+
+
+def test_trim_max_kept():
+    routine = makeRoutine()
+    stack = watched(routine, max_kept=2)
+    pages = Pages(stack)
+
+    routine.set(0, 1)
+    pages.add('a')
+    pages.delete('a')
+    routine.set(0, 2)
+    pages.add('b')
+
+    # Oldest kept step goes, with everything before it
+    assert len(stack.undo_steps) == 3
+    assert pages.destroyed == []
+
+    pages.delete('b')
+    assert pages.destroyed == ['a']
+
+
+def test_discard_undone_add():
+    stack = UndoStack()
+    pages = Pages(stack)
+
+    pages.add('a')
+    stack.undo()
+    pages.add('b')
+
+    assert pages.destroyed == ['a']
+
+
+def test_discard_applied_delete():
+    stack = UndoStack(max_steps=1)
+    pages = Pages(stack)
+
+    pages.add('a')
+    pages.delete('a')
+    # Add was dropped while applied, the delete step still has the page
+    assert pages.destroyed == []
+
+    pages.add('b')
+    assert pages.destroyed == ['a']
+
+
+def test_discard_undone_delete():
+    stack = UndoStack()
+    pages = Pages(stack)
+
+    pages.add('a')
+    pages.delete('a')
+    stack.undo()
+    stack.undo()
+    pages.add('b')
+
+    # Undone delete puts the page back, only the undone add frees it
+    assert pages.destroyed == ['a']
+    assert pages.shown == ['b']
+
+
+def test_clear_discards():
+    stack = UndoStack()
+    pages = Pages(stack)
+
+    pages.add('a')
+    pages.delete('a')
+    pages.add('b')
+    stack.undo()
+    stack.clear()
+
+    assert sorted(pages.destroyed) == ['a', 'b']
+    assert not stack.canUndo() and not stack.canRedo()
+    assert stack.size == 0
@@ -0,0 +1,204 @@
+
+class Action():
+    '''
+    Step of history that is not a change of keyframes, e.g. removing
+    a servo. size is roughly the bytes it keeps alive. discard(undone)
+    is called when the step is dropped from history, undone is True if
+    it was dropped while undone, so whatever only it kept can be freed
+    '''
+
+    __slots__ = ('undo', 'redo', 'size', 'discard')
+
+    def __init__(self, undo, redo, size=0, discard=None):
+        self.undo = undo
+        self.redo = redo
+        self.size = size
+        self.discard = discard
+
+
+class Diff():
+    '''Keyframes old at start of routine were replaced by new'''
+
+    __slots__ = ('routine', 'start', 'old', 'new')
+
+    # Python object and two arrays, roughly
+    OVERHEAD = 200
+
+    def __init__(self, routine, start, old, new):
+        self.routine = routine
+        self.start = start
+        self.old = old
+        self.new = new
+
+    @property
+    def size(self):
+        return len(self.old) + len(self.new) + Diff.OVERHEAD
+
+    def undo(self):
+        self.routine.splice(self.start, self.start+len(self.new), self.old)
+
+    def redo(self):
+        self.routine.splice(self.start, self.start+len(self.old), self.new)
+
+    def follows(self, diff):
+        '''True if this only changes the same keyframes diff changed again'''
+
+        return (diff.routine is self.routine and diff.start == self.start
+                and len(diff.new) == len(self.old) == len(self.new))
+
+
+class UndoStack():
+    '''
+    Undo and redo of routine edits. Only the keyframes that changed are
+    kept, with their old and new values, never whole routines. Edits
+    between begin() and end() are undone as one step, e.g. a whole drag.
+    The oldest steps are dropped past max_steps or max_bytes of keyframes,
+    or past max_kept steps that keep something big alive, like the page
+    of a deleted servo. Those are counted, their bytes are not known
+    '''
+
+    def __init__(self, max_steps=500, max_bytes=4*1024*1024, max_kept=10):
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.max_kept = max_kept
+
+        self.undo_steps = []       # Lists of Diffs and Actions, oldest first
+        self.redo_steps = []
+        self.size = 0              # Bytes held by both
+
+        self.group = None          # Step being built between begin() and end()
+        self.depth = 0
+        self.applying = False      # Changes made by undo()/redo() are not recorded
+
+    def watch(self, routine):
+        routine.observe(self.onRoutineChanged)
+
+    def unwatch(self, routine):
+        routine.unobserve(self.onRoutineChanged)
+
+    def canUndo(self):
+        return bool(self.undo_steps)
+
+    def canRedo(self):
+        return bool(self.redo_steps)
+
+    def begin(self):
+        '''Edits until the matching end() are one step, begin/end can nest'''
+
+        if self.depth == 0:
+            self.group = []
+        self.depth += 1
+
+    def end(self):
+        self.depth = max(self.depth - 1, 0)
+        if self.depth == 0 and self.group is not None:
+            group, self.group = self.group, None
+            if group:
+                self.push(group)
+
+    def onRoutineChanged(self, routine, start, old, new):
+        if self.applying:
+            return
+
+        diff = Diff(routine, start, old, new)
+
+        if self.group is None:
+            self.push([diff])
+        elif self.group and diff.follows(self.group[-1]):
+            # Dragging a node again keeps the first old and the last new
+            self.group[-1].new = new
+        else:
+            self.group.append(diff)
+
+    def record(self, action):
+        '''Add an Action, to the step being built if there is one'''
+
+        if self.applying:
+            return
+
+        if self.group is None:
+            self.push([action])
+        else:
+            self.group.append(action)
+
+    def push(self, step):
+        self.undo_steps.append(step)
+        self.size += stepSize(step)
+
+        # A new edit means what was undone can no longer be redone
+        self.size -= sum(stepSize(step) for step in self.redo_steps)
+        redo_steps, self.redo_steps = self.redo_steps, []
+        discard(redo_steps, undone=True)
+
+        # The newest step stays, however big. Steps are only ever dropped
+        # oldest first, so what is left can always be undone in order
+        kept = sum(1 for step in self.undo_steps if keepsObjects(step))
+        while len(self.undo_steps) > 1 and (len(self.undo_steps) > self.max_steps
+                                            or self.size > self.max_bytes
+                                            or kept > self.max_kept):
+            step = self.undo_steps.pop(0)
+            self.size -= stepSize(step)
+            kept -= keepsObjects(step)
+            discard([step], undone=False)
+
+    def undo(self):
+        '''Undo the last step, routines it changed are returned'''
+
+        if not self.undo_steps:
+            return set()
+
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+
+        return self.apply(reversed(step), 'undo')
+
+    def redo(self):
+        if not self.redo_steps:
+            return set()
+
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+
+        return self.apply(step, 'redo')
+
+    def apply(self, step, method):
+        changed = set()
+
+        self.applying = True
+        try:
+            for item in step:
+                getattr(item, method)()
+                if isinstance(item, Diff):
+                    changed.add(item.routine)
+        finally:
+            self.applying = False
+
+        return changed
+
+    def clear(self):
+        undo_steps, self.undo_steps = self.undo_steps, []
+        redo_steps, self.redo_steps = self.redo_steps, []
+        self.size = 0
+
+        discard(undo_steps, undone=False)
+        discard(redo_steps, undone=True)
+
+
+def stepSize(step):
+    return sum(item.size for item in step)
+
+
+def keepsObjects(step):
+    '''True if an Action of step has something to free when it is dropped'''
+
+    return any(isinstance(item, Action) and item.discard is not None
+               for item in step)
+
+
+def discard(steps, undone):
+    '''Let the Actions of steps dropped from history free what they kept'''
+
+    for step in steps:
+        for item in step:
+            if isinstance(item, Action) and item.discard is not None:
+                item.discard(undone)